@@ -1,285 +1,53 @@
-import json
-import queue
-import threading
+import os
 import time
 import tkinter as tk
-from enum import Enum
 from functools import partial
-from pathlib import Path
 from tkinter import ttk
 
 import matplotlib as mpl
 import matplotlib.pyplot as plt
-import numpy as np
-import serial
-import spotipy
-import spotipy.util as util
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from pynput.keyboard import Controller, Key
-from scipy.signal import find_peaks
-from serial.tools import list_ports
-
-
-# Spotify API configuration
-USERNAME = 'Nhat Huy Le'
-CLIENT_ID = '2b0cdf67c2da453fa658c15c7947ba42'
-CLIENT_SECRET = '********************************'
-REDIRECT_URI = 'http://localhost:3000'
-SCOPE = 'user-read-playback-state,user-modify-playback-state'
-
-# Get OAuth token
-token = util.prompt_for_user_token(USERNAME,
-                                   scope=SCOPE,
-                                   client_id=CLIENT_ID,
-                                   client_secret=CLIENT_SECRET,
-                                   redirect_uri=REDIRECT_URI)
-
-# Create Spotify object
-sp = spotipy.Spotify(auth=token)
-
-def playpause_playback():
-    playback = sp.current_playback()
-    if playback is not None:
-        if playback['is_playing']:
-            sp.pause_playback()
-        else:
-            sp.start_playback()
-    else:
-        sp.start_playback()
-
-def next_track():
-    sp.next_track()
-
-def previous_track():
-    sp.previous_track()
 
-def volume_up():
-    playback = sp.current_playback()
-    if playback is None:
-        return
-    current_volume = playback['device']['volume_percent']
-    sp.volume(current_volume + 10)
-
-def volume_down():
-    playback = sp.current_playback()
-    if playback is None:
-        return
-    current_volume = playback['device']['volume_percent']
-    sp.volume(current_volume - 10)
-
-def mute():
-    sp.volume(0)
+from eyeplay import metrics, spotify
+from eyeplay.actions import (
+    ACTION_NAMES,
+    COALESCE,
+    SPOTIFY_ACTIONS,
+    Actions,
+    uses_spotify,
+)
+from eyeplay.config import Config
+from eyeplay.dispatcher import ActionDispatcher
+from eyeplay.pipeline import EyeMovement
+from eyeplay.plot import LivePlot
+from eyeplay.session import ProcessSession, Session, available_ports
 
 mpl.use("TkAgg")
 
-keyboard = Controller()
-
-media_keys = {
-    "None": lambda: None,
-    "Play/Pause": partial(keyboard.press, Key.media_play_pause),
-    "Previous": partial(keyboard.press, Key.media_previous),
-    "Next": partial(keyboard.press, Key.media_next),
-    "Volume Up": partial(keyboard.press, Key.media_volume_up),
-    "Volume Down": partial(keyboard.press, Key.media_volume_down),
-    "Mute": partial(keyboard.press, Key.media_volume_mute),
-    "Spotify Play/Pause": playpause_playback,
-    "Spotify Previous": previous_track,
-    "Spotify Next": next_track,
-    "Spotify Volume Up": volume_up,
-    "Spotify Volume Down": volume_down,
-    "Spotify Mute": mute,
-    }
-
-SIGMA = 25
-BAUDRATE = 230400
-SAMPLE_FREQ = 20000  # samples per second
-CHUNK_SECONDS = 0.1
-CHUNK_SIZE = int(SAMPLE_FREQ * CHUNK_SECONDS)
-WINDOW_SECONDS = 0.8
-WINDOW_SIZE = int(SAMPLE_FREQ * WINDOW_SECONDS)
-BUFFER_SECONDS = 10.0
-BUFFER_SIZE = int(SAMPLE_FREQ * BUFFER_SECONDS)
-
-
-class EyeMovement(Enum):
-    BLINK = "blink"
-    LEFT = "left"
-    RIGHT = "right"
-    DOUBLE_BLINK = "double_blink"
-    DOUBLE_LEFT = "double_left"
-    DOUBLE_RIGHT = "double_right"
-
-    def __mul__(self, other):
-        if not isinstance(other, int):
-            raise ValueError("Multiplier must be an integer")
-        elif other <= 0:
-            raise ValueError("Multiplier must be a positive integer")
-        if other == 1:
-            return self
-        match self:
-            case EyeMovement.BLINK:
-                return EyeMovement.DOUBLE_BLINK
-            case EyeMovement.LEFT:
-                return EyeMovement.DOUBLE_LEFT
-            case EyeMovement.RIGHT:
-                return EyeMovement.DOUBLE_RIGHT
-            case _:
-                return self
-
-
-class Config:
-
-    PORT_PATH = ".config/spiker_playback/port"
-    KEYMAP_PATH = ".config/spiker_playback/keymap.json"
-
-    def __init__(self):
-        self.load_port()
-        self.load_keymap()
-
-    def load_port(self):
-        try:
-            with open(self.PORT_PATH) as file:
-                self.port = file.read()
-            if self.port not in (port.device for port in list_ports.comports()):
-                self.port = None
-        except FileNotFoundError:
-            self.port = None
-        if self.port is not None:
-            self.serial = serial.Serial(self.port, BAUDRATE)
-        else:
-            self.serial = None
-
-    def set_port(self, port):
-        self.port = port
-        with open(self.PORT_PATH, "w") as file:
-            file.write(port)
-        self.serial = serial.Serial(port, BAUDRATE)
-
-    def load_keymap(self):
-        try:
-            with open(self.KEYMAP_PATH) as file:
-                self.keymap = json.load(file)
-        except FileNotFoundError:
-            self.keymap = {
-                "blink": "Play/Pause",
-                "left": "Previous",
-                "right": "Next",
-            }
-            self.dump_keymap()
-
-    def dump_keymap(self):
-        parent = Path(self.KEYMAP_PATH).parent
-        if not parent.exists():
-            parent.mkdir(parents=True)
-        with open(self.KEYMAP_PATH, "w") as file:
-            json.dump(self.keymap, file)
-
-    def set_keymap(self, movement, key):
-        self.keymap[movement] = key
-        self.dump_keymap()
-
+actions = Actions()
+dispatcher = ActionDispatcher(actions, coalesce=COALESCE)
 
-config = Config()
-data = np.full(BUFFER_SIZE, 500.0)
-chunks = queue.Queue()
-
-
-def process():
-    global data, data_time
-    while True:
-        if config.serial is None:
-            continue
-        try:
-            read_bytes = iter(config.serial.read(CHUNK_SIZE))
-        except serial.SerialException:
-            config.load_port()
-            continue
-        chunk = []
-        while (raw_byte := next(read_bytes, None)) is not None:
-            raw_int = int(raw_byte)
-            if raw_int > 0x7F:
-                next_byte = next(read_bytes, None)
-                if next_byte is None:
-                    break
-                chunk.append((np.bitwise_and(raw_byte, 0x7F) << 7)
-                             + int(next_byte))
-        if len(chunk) == 0:
-            continue
-        chunk = np.array(chunk)
-        chunk = np.fft.fftshift(np.fft.fft(chunk))
-        max_freq = len(chunk) / CHUNK_SECONDS
-        freq_list = np.linspace(-max_freq / 2, max_freq / 2, len(chunk))
-        gaussian_filter = np.exp(-freq_list ** 2 / SIGMA ** 2)
-        chunk = np.fft.ifft(np.fft.ifftshift(chunk * gaussian_filter))
-        chunks.put(np.real(chunk))
-        data = np.append(data[len(chunk):], np.real(chunk))
-        app.update_plot()
-
-
-def classify():
-    SMOOTH_WINDOW_SEC = 0.025
-    SMOOTH_WINDOW_SIZE = int(SMOOTH_WINDOW_SEC * SAMPLE_FREQ)
-
-    window = np.zeros(WINDOW_SIZE)
-    event = None
-
-    while (chunk := chunks.get()) is not None:
-        window = np.append(window[len(chunk):], chunk)
-
-        if np.var(window) > 250:
-            # print("window event detected")
-            if event is None:
-                event = window
-            else:
-                event = np.append(event, chunk)
-                # print("event continue")
-            continue
-        elif event is None:
-            # print("window has no event")
-            continue
-
-        # event classification
-        event = event[WINDOW_SIZE // 2:-WINDOW_SIZE // 2]
-        if len(event) <= int(SAMPLE_FREQ * 0.2):
-            event = None
-            continue
-        
-        high_peaks, _ = find_peaks(event, prominence=50)
-        low_peaks, _ = find_peaks(-event, prominence=50)
-        if len(high_peaks) == 0 or len(low_peaks) == 0:
-            movement = EyeMovement.BLINK
-        else:
-            peaks = np.sort(np.concatenate((high_peaks, low_peaks)))
-            min_diff_peak = np.min(np.diff(peaks))
-            if min_diff_peak < 2065:
-                movement = EyeMovement.BLINK
-            else:
-                if np.mean(high_peaks) < np.mean(low_peaks):
-                    movement = EyeMovement.LEFT
-                else:
-                    movement = EyeMovement.RIGHT
+PLOT_FPS = 10
+METRICS_INTERVAL_MS = 1000
+# "process" reads the device in a child process, out of the GIL of Tk
+READER = os.environ.get("EYEPLAY_READER", "thread")
+# directory to record the sessions in, see eyeplay.recorder
+RECORD = os.environ.get("EYEPLAY_RECORD")
 
-        smooth_filter = np.ones(SMOOTH_WINDOW_SIZE) / SMOOTH_WINDOW_SIZE
-        smoothed = np.convolve(event, smooth_filter, mode="valid")
-        smoothed_peaks, _ = find_peaks(smoothed, prominence=50)
-        if len(smoothed_peaks) >= 2:
-            movement *= 2
-        action(movement)
 
-        # reset
-        event = None
+config = Config()
 
 
-def action(movement):
+def action(session, movement):
     print(f"{time.time()}: {movement.value}")
-    key = config.keymap.get(movement.value)
+    key = session.keymap.get(movement.value)
     if movement == EyeMovement.DOUBLE_BLINK:
         app.action_toggle.set(not app.action_toggle.get())
     if key is not None and app.action_toggle.get():
-        try:
-            media_keys[key]()
-        except:
-            pass
+        dispatcher.submit(key)
+        if session.recorder is not None:
+            session.recorder.event("action", action=key,
+                                   movement=movement.value)
 
 
 class App(tk.Frame):
@@ -306,8 +74,13 @@ class App(tk.Frame):
         self.figure = plt.figure(figsize=(12, 4))
         self.canvas = FigureCanvasTkAgg(self.figure, self)
         self.canvas.get_tk_widget().pack()
+        self.live_plot = LivePlot(self.figure, self.canvas)
         self.update_plot()
 
+        self.plot_seconds = metrics.REGISTRY.histogram(
+            "eyeplay_plot_seconds", "Seconds spent drawing a frame")
+        self.metrics_overlay = self.create_metrics_overlay()
+
         self.popup_frame = ttk.Frame(self)
         self.popup_frame.place(relx=1, rely=0, anchor=tk.NE)
         self.popup("Double blink to active/deactivate actions")
@@ -328,7 +101,7 @@ class App(tk.Frame):
         label = ttk.Label(frame, text="Device")
         label.pack(side=tk.LEFT)
 
-        devices = [port.device for port in list_ports.comports()]
+        devices = available_ports()
         combobox = ttk.Combobox(frame, values=devices)
         combobox.pack(side=tk.RIGHT)
 
@@ -340,7 +113,7 @@ class App(tk.Frame):
                                     "Device not found, please select one"))
         combobox.bind(
             "<<ComboboxSelected>>",
-            lambda _: config.set_port(combobox.get()),
+            lambda _: select_port(combobox.get()),
         )
 
         return frame
@@ -377,38 +150,113 @@ class App(tk.Frame):
         label = ttk.Label(frame, text=text, width=9, anchor=tk.W)
         label.pack(side=tk.LEFT)
 
-        combobox = ttk.Combobox(frame, values=[*media_keys.keys()])
+        combobox = ttk.Combobox(frame, values=ACTION_NAMES)
         combobox.pack(side=tk.RIGHT)
 
         selected = config.keymap.get(movement.value)
         if selected:
-            combobox.current(list(media_keys).index(selected))
+            combobox.current(ACTION_NAMES.index(selected))
         else:
             combobox.current(0)
         combobox.bind(
             "<<ComboboxSelected>>",
-            lambda _: config.set_keymap(movement.value, combobox.get()),
+            lambda _: select_action(movement, combobox.get()),
         )
 
         return frame
 
+    def create_metrics_overlay(self):
+        label = tk.Label(self,
+                         font="TkFixedFont",
+                         justify=tk.LEFT,
+                         bg="lightgrey",
+                         fg="black",
+                         )
+        self.metrics_job = None
+        self.metrics_previous = None
+        # F2 shows where the time goes, to diagnose an overloaded station
+        self.master.bind("<F2>", self.toggle_metrics)
+        return label
+
+    def toggle_metrics(self, _=None):
+        if self.metrics_job is None:
+            self.metrics_overlay.place(relx=0, rely=1, anchor=tk.SW)
+            self.update_metrics()
+        else:
+            self.after_cancel(self.metrics_job)
+            self.metrics_job = None
+            self.metrics_previous = None
+            self.metrics_overlay.place_forget()
+
+    def update_metrics(self):
+        def ms(histogram, q):
+            value = histogram.quantile(q)
+            return "      -" if value is None else f"{value * 1000:7.2f}"
+
+        stats = session.stats()
+        now = (time.perf_counter(), stats["samples"], stats["classified"])
+        rate_in = rate_out = 0.0
+        if self.metrics_previous is not None:
+            elapsed = now[0] - self.metrics_previous[0]
+            rate_in = (now[1] - self.metrics_previous[1]) / elapsed
+            rate_out = (now[2] - self.metrics_previous[2]) / elapsed
+        self.metrics_previous = now
+
+        lines = [
+            f"samples/s in {rate_in:6.0f}  out {rate_out:6.0f}",
+            f"backlog {stats['backlog']} chunks, dropped "
+            f"{stats['dropped_chunks']} chunks, {stats['dropped_bytes']} bytes",
+            f"{'stage':<20}  p50 ms  p99 ms",
+        ]
+        timings = [*session.timings.items(), ("plot", self.plot_seconds)]
+        for key in dispatcher.action_stats:
+            timings.append((key, metrics.REGISTRY.get(
+                "eyeplay_action_seconds", action=key)))
+        for name, histogram in timings:
+            lines.append(f"{name:<20} {ms(histogram, 0.5)} "
+                         f"{ms(histogram, 0.99)}")
+        self.metrics_overlay.config(text="\n".join(lines))
+        self.metrics_job = self.after(METRICS_INTERVAL_MS,
+                                      self.update_metrics)
+
     def update_plot(self):
-        ax = self.figure.gca()
-        ax.clear()
-        ax.plot(data)
-        ax.grid(True, axis="y")
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.spines['bottom'].set_visible(False)
-        ax.spines['left'].set_visible(False)
-        ax.get_xaxis().set_ticks([])
-        self.canvas.draw()
+        start = time.perf_counter()
+        self.live_plot.update(session.display.latest(copy=True))
+        self.plot_seconds.since(start)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        # skip ahead rather than queue up frames when drawing is slow
+        self.after(max(1, int(1000 / PLOT_FPS - elapsed_ms)),
+                   self.update_plot)
+
+
+def select_action(movement, key):
+    config.set_keymap(movement.value, key)
+    if key in SPOTIFY_ACTIONS:
+        spotify.authenticate()
+
+
+def select_port(port):
+    config.set_port(port)
+    session.open(port)
+
 
+# created before any thread, as the reader process is forked
+session = (ProcessSession if READER == "process" else Session)(
+    config.port, config.keymap, on_movement=action, params=config.detector,
+    model=config.model, record=RECORD)
 
 root = tk.Tk()
 root.title("eyePlay")
 app = App(root)
 
-threading.Thread(target=process, daemon=True).start()
-threading.Thread(target=classify, daemon=True).start()
+session.start()
+dispatcher.start()
+try:
+    metrics.serve()
+except OSError as error:
+    print(f"{time.time()}: metrics not served: {error!r}")
+if uses_spotify(config.keymap):
+    spotify.authenticate()
 app.mainloop()
+# writes out the rest of the recording, if any
+session.stop(timeout=1.0)
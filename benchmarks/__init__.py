@@ -0,0 +1,48 @@
+"""Micro-benchmarks for the real-time pipeline.
+
+Run them from the repository root, e.g. ``python -m benchmarks.decoder``.
+"""
+import time
+
+import numpy as np
+
+from eyeplay import datasets
+from eyeplay.datasets import DATA_DIR
+from eyeplay.simulator import device_samples
+
+
+def recorded_samples(pattern="week9/*.wav"):
+    """Return a recorded session as device samples, with its sample rate
+    and name.
+
+    Falls back to a synthetic signal when the recordings are not available,
+    e.g. when the Git LFS objects have not been pulled.
+    """
+    for path in sorted(DATA_DIR.glob(pattern)):
+        try:
+            _, samples, sample_freq, _ = datasets.load(path)
+        except ValueError:
+            continue
+        return device_samples(samples), sample_freq, path.name
+    return synthetic_samples(), 10_000, "synthetic"
+
+
+def synthetic_samples(seconds=40.0, sample_freq=10_000, seed=42):
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sample_freq)
+    t = np.arange(n) / sample_freq
+    samples = 500 + 20 * rng.standard_normal(n)
+    # a blink-like bump every two seconds
+    for onset in np.arange(1.0, seconds - 1.0, 2.0):
+        samples += 300 * np.exp(-((t - onset) / 0.05) ** 2)
+    return np.clip(samples, 0, 0x3FFF).astype(np.int16)
+
+
+def best_of(func, *args, repeat=5):
+    """Return the best wall time of ``repeat`` calls, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
@@ -0,0 +1,67 @@
+"""Compare the CPU cost of the pipeline at several decimation factors.
+
+A recorded session is replayed, filtered and classified, once per factor,
+and the CPU time is reported per second of signal, along with the cost of
+reducing the display buffer for one frame of the live plot. The
+detections are compared against those at the full rate, by movement and
+by the chunk that completed them.
+"""
+import time
+
+import numpy as np
+
+from benchmarks import recorded_samples
+from eyeplay.pipeline import SERIAL_FREQ, Classifier, holds_for
+from eyeplay.plot import minmax_decimate
+from eyeplay.replay import replay
+from eyeplay.session import BUFFER_SECONDS
+
+FACTORS = (1, 5, 10, 20, 40)
+PLOT_WIDTH = 800  # pixels
+REPEAT = 3
+
+
+def cpu_seconds(func, *args, repeat=REPEAT):
+    """Return the least CPU time of ``repeat`` calls, and the last result."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        result = func(*args)
+        best = min(best, time.process_time() - start)
+    return best, result
+
+
+def main():
+    samples, sample_freq, source = recorded_samples()
+    seconds = len(samples) / sample_freq
+    print(f"source: {source}, {seconds:.0f} s")
+    print(f"{'factor':>6} {'rate':>8} {'replay':>12} {'speculative':>12} "
+          f"{'plot frame':>10} {'same':>9}")
+
+    reference = None
+    for factor in FACTORS:
+        plain, detections = cpu_seconds(
+            lambda: replay(samples, sample_freq, Classifier(
+                decimation=factor)))
+        speculative, _ = cpu_seconds(
+            lambda: replay(samples, sample_freq, Classifier(
+                holds=holds_for({}), decimation=factor)))
+        display = np.zeros(int(SERIAL_FREQ / factor * BUFFER_SECONDS))
+        plot, _ = cpu_seconds(minmax_decimate, display, PLOT_WIDTH,
+                              repeat=20)
+
+        found = [(detection.sample, detection.movement.value)
+                 for detection in detections]
+        if reference is None:
+            reference = found
+        same = len(set(found) & set(reference))
+        print(f"{factor:>6} {sample_freq / factor:>6,.0f}Hz "
+              f"{plain / seconds * 1000:>9.2f} ms "
+              f"{speculative / seconds * 1000:>9.2f} ms "
+              f"{plot * 1e6:>7.0f} us "
+              f"{same:>4}/{len(reference):<4}")
+    print("replay times are CPU per second of signal")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Compare the vectorized frame decoder against the per-byte loop."""
+import numpy as np
+
+from benchmarks import best_of, recorded_samples
+from eyeplay.decoder import FrameDecoder, encode_frames
+
+CHUNK_SIZE = 2000
+
+
+def loop_decode(raw):
+    # the loop previously used in app.process()
+    read_bytes = iter(raw)
+    chunk = []
+    while (raw_byte := next(read_bytes, None)) is not None:
+        raw_int = int(raw_byte)
+        if raw_int > 0x7F:
+            next_byte = next(read_bytes, None)
+            if next_byte is None:
+                break
+            chunk.append((np.bitwise_and(raw_byte, 0x7F) << 7)
+                         + int(next_byte))
+    return np.array(chunk)
+
+
+def run(decode, stream):
+    for i in range(0, len(stream), CHUNK_SIZE):
+        decode(stream[i:i + CHUNK_SIZE])
+
+
+def main():
+    samples, _, source = recorded_samples()
+    # start mid-frame so that every read splits a frame
+    stream = encode_frames(samples)[1:]
+    n = len(samples)
+
+    print(f"source: {source}, {n} samples, {CHUNK_SIZE}-byte reads")
+    for name, decode in (("loop", loop_decode),
+                         ("vectorized", FrameDecoder().decode)):
+        seconds = best_of(run, decode, stream, repeat=3)
+        print(f"{name:>10}: {n / seconds:14,.0f} samples/s")
+
+
+if __name__ == "__main__":
+    main()
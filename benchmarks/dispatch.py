@@ -0,0 +1,232 @@
+"""Check and stress the action dispatcher against a local fake Spotify.
+
+First, the actions of the application are run through the dispatcher to
+check that commands run in order, that repeated volume commands coalesce
+into one request, and that commands past their deadline or pushed out of a
+full queue are dropped. Then commands are submitted at a fixed rate, each
+one a single API request, and the time from submission to completion is
+measured per command. The polling linked list previously used in
+test_app.py is run for comparison, with fewer commands since it serves at
+most one per poll.
+"""
+import argparse
+import threading
+import time
+from functools import partial
+
+import numpy as np
+import spotipy
+
+from eyeplay.actions import COALESCE, Actions
+from eyeplay.dispatcher import ActionDispatcher
+from eyeplay.fakespotify import FakeSpotify
+from eyeplay.metrics import Registry
+from eyeplay.spotify import http_session
+
+KEYS = ("Spotify Next", "Spotify Previous")
+NEXT = "POST /v1/me/player/next"
+PREVIOUS = "POST /v1/me/player/previous"
+VOLUME = "PUT /v1/me/player/volume"
+
+
+class Node:
+    def __init__(self, data):
+        self.data = data
+        self.next = None
+        self.processed = False
+
+
+class LinkedListQueue:
+    # the queue previously used in test_app.py
+    def __init__(self, handlers, poll=1.0):
+        self.handlers = handlers
+        self.poll = poll
+        self.head = self.curr = self.tail = None
+        self.lock = threading.Lock()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._work, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+        self._thread.join()
+
+    def submit(self, key):
+        node = Node(key)
+        with self.lock:
+            if self.head is None:
+                self.head = self.curr = self.tail = node
+            else:
+                self.tail.next = node
+                self.tail = node
+                if self.curr.processed:
+                    self.curr = self.curr.next
+
+    def _work(self):
+        while not self._stopped:
+            time.sleep(self.poll)
+            with self.lock:
+                if self.curr and not self.curr.processed:
+                    self.handlers[self.curr.data]()
+                    self.curr.processed = True
+                    if self.curr.next:
+                        self.curr = self.curr.next
+
+
+def client(fake):
+    sp = spotipy.Spotify(auth="fake", requests_session=http_session())
+    sp.prefix = fake.url
+    return sp
+
+
+def dispatcher_for(fake, done, **kwargs):
+    """Return a dispatcher of the application's actions against ``fake``,
+    appending the key of every command run to ``done``.
+    """
+    actions = Actions(connect=partial(client, fake))
+
+    def handler(key):
+        def run(*args):
+            done.append(key)
+            actions[key](*args)
+        return run
+
+    handlers = {key: handler(key) for key in
+                ("Spotify Next", "Spotify Previous", "Spotify Play/Pause",
+                 *COALESCE)}
+    kwargs.setdefault("coalesce", COALESCE)
+    dispatcher = ActionDispatcher(handlers, verbose=False,
+                                  registry=Registry(), **kwargs)
+    return dispatcher, actions
+
+
+def check_order():
+    keys = ["Spotify Next", "Spotify Previous", "Spotify Play/Pause"] * 10
+    done = []
+    with FakeSpotify() as fake:
+        dispatcher, actions = dispatcher_for(fake, done,
+                                             deadline=float("inf"),
+                                             maxsize=len(keys))
+        dispatcher.start()
+        for key in keys:
+            dispatcher.submit(key)
+        dispatcher.stop()
+        actions.close()
+        assert done == keys, done
+        assert fake.requests[NEXT] == fake.requests[PREVIOUS] == 10
+        assert fake.track == 0 and not fake.is_playing
+        assert dispatcher.dropped == dispatcher.stale == 0
+
+
+def check_coalescing(latency=0.1):
+    done = []
+    with FakeSpotify(latency=latency, volume=50) as fake:
+        dispatcher, actions = dispatcher_for(fake, done)
+        actions.playback().refresh()
+        dispatcher.start()
+        # the volume commands queue up while the worker waits on the first
+        keys = ["Spotify Next"] + ["Spotify Volume Up"] * 3 \
+            + ["Spotify Volume Down"] * 2 + ["Spotify Volume Up"]
+        for key in keys:
+            dispatcher.submit(key)
+        dispatcher.stop()
+        actions.close()
+        assert done == ["Spotify Next", "Spotify Volume Up",
+                        "Spotify Volume Down", "Spotify Volume Up"], done
+        assert fake.requests[VOLUME] == 3
+        assert fake.volume == 70 and actions.playback().volume == 70
+
+
+def check_drops(latency=0.2):
+    done = []
+    with FakeSpotify(latency=latency) as fake:
+        dispatcher, actions = dispatcher_for(fake, done, maxsize=2,
+                                             deadline=latency / 2)
+        dispatcher.start()
+        dispatcher.submit("Spotify Next")
+        time.sleep(latency / 4)  # taken by the worker
+        # the first is pushed out of the queue, the others expire in it
+        for key in ("Spotify Volume Up", "Spotify Previous",
+                    "Spotify Previous"):
+            dispatcher.submit(key)
+        dispatcher.stop()
+        actions.close()
+        assert done == ["Spotify Next"], done
+        assert dispatcher.dropped == 1 and dispatcher.stale == 2
+        assert fake.requests[PREVIOUS] == fake.requests[VOLUME] == 0
+        assert fake.track == 1
+
+
+def check():
+    for run in (check_order, check_coalescing, check_drops):
+        run()
+        print(f"{run.__name__}: ok")
+
+
+def stress(queue, count, rate, done):
+    created = []
+    for i in range(count):
+        created.append(time.perf_counter())
+        queue.submit(KEYS[i % len(KEYS)])
+        time.sleep(max(0.0, created[0] + (i + 1) / rate
+                       - time.perf_counter()))
+    while len(done) < count:
+        time.sleep(0.001)
+    latency = np.array(done) - np.array(created)
+    return count / (done[-1] - created[0]), latency
+
+
+def report(name, throughput, latency):
+    p50, p99 = np.percentile(latency, [50, 99]) * 1000
+    print(f"{name:>12}: {throughput:8,.0f} commands/s, "
+          f"p50 {p50:7.1f} ms, p99 {p99:7.1f} ms, "
+          f"max {latency.max() * 1000:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.dispatch")
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=200.0,
+                        help="commands submitted per second")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds added to every fake API response")
+    parser.add_argument("--legacy-count", type=int, default=5)
+    args = parser.parse_args()
+
+    check()
+    with FakeSpotify(latency=args.latency) as fake:
+        sp = client(fake)
+        done = []
+
+        def handler(method):
+            def run():
+                method()
+                # one worker runs the commands in order
+                done.append(time.perf_counter())
+            return run
+
+        handlers = {"Spotify Next": handler(sp.next_track),
+                    "Spotify Previous": handler(sp.previous_track)}
+        print(f"{args.count} commands at {args.rate:,.0f}/s, "
+              f"{args.latency * 1000:.0f} ms per request")
+
+        dispatcher = ActionDispatcher(handlers, maxsize=args.count,
+                                      deadline=float("inf"),
+                                      verbose=False).start()
+        report("dispatcher", *stress(dispatcher, args.count, args.rate, done))
+        dispatcher.stop()
+        assert dispatcher.dropped == dispatcher.stale == 0
+        assert fake.requests[NEXT] + fake.requests[PREVIOUS] == args.count
+
+        done.clear()
+        legacy = LinkedListQueue(handlers).start()
+        report("linked list",
+               *stress(legacy, args.legacy_count, args.rate, done))
+        legacy.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Compare prominence sweeps of the peak features.
+
+The notebooks call ``find_peaks`` once per clip, prominence and polarity.
+:func:`eyeplay.features.sweep` finds the peaks of a clip once and
+thresholds their prominences, on one process or a pool. The rates are in
+clips times prominences per second.
+"""
+import os
+import time
+
+import numpy as np
+from scipy.signal import find_peaks
+
+from benchmarks import recorded_samples
+from eyeplay import features
+from eyeplay.filters import GaussianFilter
+from eyeplay.pipeline import SIGMA
+
+PROMINENCES = np.arange(10, 100, 2)
+N_CLIPS = 1000
+N_LEGACY = 50
+
+
+def clip_features(amp, prominence):
+    # the features previously computed in analysis/event.ipynb
+    high_peaks, _ = find_peaks(amp, prominence=prominence)
+    low_peaks, _ = find_peaks(-amp, prominence=prominence)
+    peaks = np.sort(np.concatenate([high_peaks, low_peaks]))
+    min_diff_peak = np.min(np.diff(peaks)) if len(peaks) > 1 else 0
+    return {
+        "min_diff_peak": min_diff_peak,
+        "len_peak": len(peaks)
+    }
+
+
+def make_clips(samples, sample_freq, n, seed=42):
+    rng = np.random.default_rng(seed)
+    signal = GaussianFilter(SIGMA, sample_freq).process(samples)
+    lengths = rng.integers(sample_freq // 2, 3 * sample_freq, n)
+    starts = rng.integers(0, len(signal) - lengths.max(), n)
+    return [signal[start:start + length]
+            for start, length in zip(starts, lengths)]
+
+
+def main():
+    samples, sample_freq, source = recorded_samples()
+    clips = make_clips(samples, sample_freq, N_CLIPS)
+    print(f"source: {source}, {len(clips)} clips, "
+          f"{len(PROMINENCES)} prominences")
+
+    start = time.perf_counter()
+    legacy = [[clip_features(clip, prominence) for clip in clips[:N_LEGACY]]
+              for prominence in PROMINENCES]
+    seconds = time.perf_counter() - start
+    print(f"{'notebook':>10}: {N_LEGACY * len(PROMINENCES) / seconds:10,.0f}"
+          f"/s ({N_LEGACY} clips)")
+
+    for name, processes in (("serial", 1), (f"{os.cpu_count()} procs", None)):
+        start = time.perf_counter()
+        swept = features.sweep(clips, PROMINENCES, processes=processes)
+        seconds = time.perf_counter() - start
+        print(f"{name:>10}: {len(clips) * len(PROMINENCES) / seconds:10,.0f}"
+              f"/s, {seconds:.2f} s")
+
+    for i in range(len(PROMINENCES)):
+        for j, expected in enumerate(legacy[i]):
+            assert swept[i, j]["n_peak"] == expected["len_peak"]
+            assert swept[i, j]["min_diff_peak"] == expected["min_diff_peak"]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Compare the streaming filters against per-chunk FFT filtering.
+
+The error is measured against the whole recording filtered in one go, next
+to chunk boundaries and away from them.
+"""
+import numpy as np
+from scipy.ndimage import gaussian_filter1d
+
+from benchmarks import best_of, recorded_samples
+from eyeplay.filters import ButterworthFilter, GaussianFilter
+
+SIGMA = 25
+CHUNK_SECONDS = 0.1
+BOUNDARY = 20  # samples either side of a chunk boundary
+
+
+def fft_gaussian(chunk, sigma=SIGMA):
+    # the per-chunk filter previously used in app.process()
+    chunk = np.fft.fftshift(np.fft.fft(chunk))
+    max_freq = len(chunk) / CHUNK_SECONDS
+    freq_list = np.linspace(-max_freq / 2, max_freq / 2, len(chunk))
+    gaussian_filter = np.exp(-freq_list ** 2 / sigma ** 2)
+    return np.real(np.fft.ifft(np.fft.ifftshift(chunk * gaussian_filter)))
+
+
+def run(process, samples, chunk_size):
+    return np.concatenate([process(samples[i:i + chunk_size])
+                           for i in range(0, len(samples), chunk_size)])
+
+
+def errors(filtered, reference, chunk_size, delay=0):
+    if delay:
+        filtered = filtered[delay:]
+        reference = reference[:-delay]
+    offset = (np.arange(len(reference)) + delay) % chunk_size
+    near = np.minimum(offset, chunk_size - offset) < BOUNDARY
+    error = filtered - reference
+    return (np.sqrt(np.mean(error[near] ** 2)),
+            np.sqrt(np.mean(error[~near] ** 2)))
+
+
+def main():
+    samples, sample_freq, source = recorded_samples("week9/*.wav")
+    samples = samples.astype(np.float64)
+    chunk_size = int(sample_freq * CHUNK_SECONDS)
+    tau = sample_freq / (np.sqrt(2) * np.pi * SIGMA)
+    reference = gaussian_filter1d(samples, tau, mode="nearest")
+
+    print(f"source: {source}, {len(samples)} samples at {sample_freq} Hz")
+    print(f"{'filter':>12} {'samples/s':>14} {'rms@boundary':>13} "
+          f"{'rms@interior':>13}")
+    candidates = (
+        ("fft chunk", lambda: fft_gaussian, 0),
+        ("gaussian", lambda: GaussianFilter(SIGMA, sample_freq).process,
+         GaussianFilter(SIGMA, sample_freq).delay),
+        ("butterworth", lambda: ButterworthFilter(SIGMA, sample_freq).process,
+         0),
+    )
+    for name, make, delay in candidates:
+        seconds = best_of(lambda: run(make(), samples, chunk_size), repeat=3)
+        filtered = run(make(), samples, chunk_size)
+        boundary, interior = errors(filtered, reference, chunk_size, delay)
+        print(f"{name:>12} {len(samples) / seconds:14,.0f} "
+              f"{boundary:13.2f} {interior:13.2f}")
+
+
+if __name__ == "__main__":
+    main()
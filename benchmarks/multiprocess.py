@@ -0,0 +1,109 @@
+"""Compare the threaded and the process reader under a synthetic GUI load.
+
+A recorded session is streamed to a pseudo-terminal by a
+:class:`eyeplay.simulator.Simulator`, at a fixed rate and without ever
+blocking, like the device. Bytes that do not fit in the terminal buffer
+are lost, as they would be in the driver. Meanwhile a thread holds the GIL
+for ``--load`` ms of every frame of the plot, in a single call into C like
+a redraw, then reads the display buffer like the GUI.
+"""
+import argparse
+import os
+import random
+import threading
+import time
+
+from benchmarks import recorded_samples
+from eyeplay.plot import minmax_decimate
+from eyeplay.session import ProcessSession, Session
+from eyeplay.simulator import Simulator
+
+PLOT_FPS = 10
+PLOT_WIDTH = 800  # pixels
+
+
+def blocking_call(seconds):
+    """Return a call that holds the GIL for about ``seconds``."""
+    items = list(range(100_000))
+    random.Random(0).shuffle(items)
+    start = time.perf_counter()
+    sorted(items)
+    n = int(len(items) * seconds / (time.perf_counter() - start))
+    items = list(range(n))
+    random.Random(0).shuffle(items)
+    return lambda: sorted(items)
+
+
+def gui_load(session, draw, stopped):
+    frames = 0
+    while not stopped.is_set():
+        start = time.perf_counter()
+        draw()
+        minmax_decimate(session.display.latest(copy=True), PLOT_WIDTH)
+        frames += 1
+        stopped.wait(max(0.0, 1 / PLOT_FPS - (time.perf_counter() - start)))
+    return frames
+
+
+def run(session_class, samples, sample_freq, rate, load):
+    draw = blocking_call(load) if load else (lambda: None)
+    simulator = Simulator(samples, sample_freq, rate)
+    movements = []
+    session = session_class(simulator.port,
+                            on_movement=lambda _, m: movements.append(m))
+    simulator.start()
+    session.start()
+    stopped = threading.Event()
+    loader = threading.Thread(target=gui_load,
+                              args=(session, draw, stopped))
+    loader.start()
+    simulator.join()
+    time.sleep(1.0)
+    stopped.set()
+    loader.join()
+    stats = session.stats()
+    queue = session.timings["queue"]
+    session.stop(timeout=1.0)
+    simulator.stop()
+    data = len(simulator.data)
+    return {
+        "lost": simulator.lost / data,
+        "dropped_bytes": stats["dropped_bytes"],
+        "received": stats["bytes_read"] / data,
+        "movements": len(movements),
+        "queue_p99": queue.quantile(0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.multiprocess")
+    parser.add_argument("--seconds", type=float, default=20.0,
+                        help="of the recording to stream")
+    parser.add_argument("--rate", type=float, default=1.0,
+                        help="speed of the stream relative to the device")
+    parser.add_argument("--load", type=float, nargs="+",
+                        default=[0.0, 50.0, 90.0],
+                        help="ms per plot frame holding the GIL")
+    args = parser.parse_args()
+
+    samples, sample_freq, source = recorded_samples()
+    samples = samples[:int(args.seconds * sample_freq)]
+    print(f"source: {source}, {len(samples) / sample_freq:.0f} s at "
+          f"{args.rate:g}x, {os.cpu_count()} CPUs")
+    print(f"{'reader':>8} {'load':>6} {'lost':>7} {'received':>8} "
+          f"{'bad frames':>10} {'queue p99':>9} {'movements':>9}")
+    for load in args.load:
+        for name, session_class in (("thread", Session),
+                                    ("process", ProcessSession)):
+            result = run(session_class, samples, sample_freq, args.rate,
+                         load / 1000)
+            queue = result["queue_p99"]
+            print(f"{name:>8} {load:>4.0f}ms {result['lost']:>7.1%} "
+                  f"{result['received']:>8.1%} "
+                  f"{result['dropped_bytes']:>10} "
+                  f"{'-' if queue is None else f'{queue * 1000:.0f}ms':>9} "
+                  f"{result['movements']:>9}")
+
+
+if __name__ == "__main__":
+    main()
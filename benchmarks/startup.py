@@ -0,0 +1,88 @@
+"""Cold-start time and peak memory of the GUI and the headless daemon.
+
+Each mode runs in a fresh interpreter, which does what the entry point does
+before it starts reading the serial port. The Spotify token request is left
+out, as it depends on the network. Without a display, the GUI mode stops
+short of creating the Tk window.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+# the peak RSS of this process alone: on Linux, ru_maxrss of a child
+# starts from the peak of the parent it was forked from
+REPORT = """
+import json, resource, sys
+try:
+    with open("/proc/self/status") as status:
+        rss = next(int(line.split()[1]) * 1024 for line in status
+                   if line.startswith("VmHWM:"))
+except OSError:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        rss *= 1024
+print(json.dumps({"rss": rss}))
+"""
+
+MODES = {
+    "python": "",
+    "daemon": """
+from eyeplay.actions import Actions
+from eyeplay.daemon import Daemon
+from eyeplay.session import Session
+session = Session()
+actions = Actions()
+""",
+    "gui": """
+import os
+import tkinter as tk
+import matplotlib as mpl
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from eyeplay.actions import Actions
+from eyeplay.plot import LivePlot
+from eyeplay.session import Session
+if os.environ.get("DISPLAY"):
+    mpl.use("TkAgg")
+session = Session()
+actions = Actions()
+figure = plt.figure(figsize=(12, 4))
+if os.environ.get("DISPLAY"):
+    root = tk.Tk()
+    canvas = FigureCanvasTkAgg(figure, root)
+    canvas.draw()
+""",
+}
+# what app.py imported before the actions were created on first use
+MODES["gui, eager"] = MODES["gui"] + """
+import spotipy
+try:
+    import pynput.keyboard
+except ImportError:
+    pass  # needs a display on Linux
+"""
+
+
+def run(code):
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", code + REPORT],
+                            capture_output=True, text=True, check=True,
+                            cwd=os.getcwd()).stdout
+    return time.perf_counter() - start, json.loads(output)["rss"]
+
+
+def main(repeat=5):
+    display = "with" if os.environ.get("DISPLAY") else "without"
+    print(f"best of {repeat} cold starts, {display} a display")
+    for name, code in MODES.items():
+        results = [run(code) for _ in range(repeat)]
+        seconds = min(seconds for seconds, _ in results)
+        rss = min(rss for _, rss in results)
+        print(f"{name:>11}: {seconds * 1000:6.0f} ms, "
+              f"{rss / 2 ** 20:6.1f} MiB peak RSS")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Compare the early-closing variance trigger against the previous one.
+
+The previous trigger recomputed the variance of the whole window for every
+chunk and closed an event only after a full window of quiet.
+"""
+import numpy as np
+
+from benchmarks import best_of, synthetic_samples
+from eyeplay import datasets
+from eyeplay.pipeline import (
+    VARIANCE_THRESHOLD,
+    WINDOW_SIZE,
+    Classifier,
+    VarianceTrigger,
+)
+from eyeplay.replay import replay
+from eyeplay.ringbuffer import RingBuffer
+
+MATCH_SECONDS = 1.0
+
+
+class WholeWindowTrigger:
+    # the trigger previously used in Classifier.push()
+    lead = WINDOW_SIZE - WINDOW_SIZE // 2
+    lag = WINDOW_SIZE // 2
+
+    def __init__(self):
+        self.window = RingBuffer(WINDOW_SIZE, fill=0.0)
+
+    def update(self, chunk):
+        self.window.write(chunk)
+        return np.var(self.window.latest()) > VARIANCE_THRESHOLD
+
+
+def update_cost(trigger, chunks):
+    def run():
+        for chunk in chunks:
+            trigger.update(chunk)
+    return best_of(run, repeat=3) / len(chunks)
+
+
+def main():
+    recordings = [(recording.path.name, recording.samples,
+                   recording.sample_freq)
+                  for recording in datasets.load_all()]
+    if not recordings:
+        recordings = [("synthetic", synthetic_samples(), 10_000)]
+
+    chunks = np.split(synthetic_samples(10).astype(np.float64), 100)
+    print("cost per update: "
+          f"whole window {update_cost(WholeWindowTrigger(), chunks) * 1e6:.1f} us, "
+          f"early closing {update_cost(VarianceTrigger(), chunks) * 1e6:.1f} us")
+
+    earlier = []
+    agree = matched = total_old = total_new = 0
+    for name, samples, sample_freq in recordings:
+        old = replay(samples, sample_freq, Classifier(WholeWindowTrigger()))
+        new = replay(samples, sample_freq, Classifier())
+        total_old += len(old)
+        total_new += len(new)
+        new_times = np.array([detection.seconds for detection in new])
+        for detection in old:
+            if len(new_times) == 0:
+                break
+            # the new trigger decides earlier, so look back from the old one
+            gaps = detection.seconds - new_times
+            i = np.argmin(np.where(gaps >= 0, gaps, np.inf))
+            if not 0 <= gaps[i] <= MATCH_SECONDS:
+                continue
+            matched += 1
+            agree += new[i].movement == detection.movement
+            earlier.append(gaps[i])
+
+    print(f"recordings: {len(recordings)}, events: "
+          f"{total_old} whole window, {total_new} early closing")
+    if matched:
+        print(f"matched {matched} events, {agree / matched:.1%} classified "
+              f"the same, decided {np.mean(earlier):.3f} s earlier on average")
+
+
+if __name__ == "__main__":
+    main()
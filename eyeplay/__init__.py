@@ -0,0 +1 @@
+"""Signal processing pipeline behind the eyePlay application."""
@@ -0,0 +1,83 @@
+"""Actions that eye movements can be mapped to.
+
+Media keys need pynput, which needs a display on Linux, and the Spotify
+actions need an authenticated client. Both are set up on first use, so
+nothing is imported or authenticated for actions that are not mapped.
+"""
+import threading
+
+MEDIA_KEYS = {
+    "Play/Pause": "media_play_pause",
+    "Previous": "media_previous",
+    "Next": "media_next",
+    "Volume Up": "media_volume_up",
+    "Volume Down": "media_volume_down",
+    "Mute": "media_volume_mute",
+}
+SPOTIFY_ACTIONS = {
+    "Spotify Play/Pause": "playpause",
+    "Spotify Previous": "previous_track",
+    "Spotify Next": "next_track",
+    "Spotify Volume Up": "volume_up",
+    "Spotify Volume Down": "volume_down",
+    "Spotify Mute": "mute",
+}
+ACTION_NAMES = ["None", *MEDIA_KEYS, *SPOTIFY_ACTIONS]
+# called with the number of repeats, see ActionDispatcher
+COALESCE = ("Spotify Volume Up", "Spotify Volume Down")
+
+
+def uses_spotify(keymap):
+    return any(action in SPOTIFY_ACTIONS for action in keymap.values())
+
+
+class Actions(dict):
+    """Handlers by action name, created when an action is first run.
+
+    ``connect`` returns the Spotify client, see :func:`eyeplay.spotify.connect`.
+    Until it succeeds, Spotify actions fail and are set up again next time,
+    while media keys keep working.
+    """
+
+    def __init__(self, connect=None):
+        super().__init__()
+        self.connect = connect
+        self._keyboard = None
+        self._playback = None
+        self._lock = threading.Lock()
+        self["None"] = lambda: None
+
+    def __missing__(self, name):
+        if name in MEDIA_KEYS:
+            handler = self._media_key(MEDIA_KEYS[name])
+        elif name in SPOTIFY_ACTIONS:
+            handler = getattr(self.playback(), SPOTIFY_ACTIONS[name])
+        else:
+            raise KeyError(name)
+        self[name] = handler
+        return handler
+
+    def _media_key(self, key_name):
+        with self._lock:
+            if self._keyboard is None:
+                from pynput.keyboard import Controller
+                self._keyboard = Controller()
+        from pynput.keyboard import Key
+        key = getattr(Key, key_name)
+        return lambda: self._keyboard.press(key)
+
+    def playback(self):
+        """Return the Spotify playback, connecting on the first call."""
+        with self._lock:
+            if self._playback is None:
+                from eyeplay.playback import SpotifyPlayback
+                if self.connect is None:
+                    from eyeplay.spotify import connect
+                    self.connect = connect
+                sp = self.connect()
+                self._playback = SpotifyPlayback(sp).start_polling()
+            return self._playback
+
+    def close(self):
+        if self._playback is not None:
+            self._playback.stop_polling()
@@ -0,0 +1,77 @@
+"""Bounded hand-off of chunks from the serial reader to the classifier.
+
+The reader must never block on a slow classifier, or the serial buffer
+overflows and frames are lost in the driver instead. So when the
+classifier falls behind, chunks are discarded here, by an explicit policy,
+and counted.
+"""
+import collections
+import threading
+
+DROP_OLDEST = "drop-oldest"
+LATEST = "latest"
+POLICIES = (DROP_OLDEST, LATEST)
+
+
+class Channel:
+    """Bounded queue between one producer and one consumer.
+
+    With ``drop-oldest``, putting into a full channel discards the oldest
+    item, so the consumer lags by at most ``maxsize`` items. With
+    ``latest``, :meth:`get` skips everything queued but the newest item, so
+    the consumer always works on the present. ``dropped`` counts the items
+    discarded either way.
+    """
+
+    def __init__(self, maxsize, policy=DROP_OLDEST):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overload policy: {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.put_count = 0
+        self.dropped = 0
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def __len__(self):
+        return len(self._queue)
+
+    def put(self, item):
+        with self._condition:
+            if len(self._queue) >= self.maxsize:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(item)
+            self.put_count += 1
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """Return the next item, or None once closed and empty, or after
+        ``timeout`` seconds.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._queue or self._closed,
+                                     timeout)
+            if not self._queue:
+                return None
+            if self.policy == LATEST:
+                self.dropped += len(self._queue) - 1
+                item = self._queue.pop()
+                self._queue.clear()
+                return item
+            return self._queue.popleft()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def stats(self):
+        return {
+            "policy": self.policy,
+            "queued": len(self._queue),
+            "maxsize": self.maxsize,
+            "put": self.put_count,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,110 @@
+"""Settings shared by the application and the daemon.
+
+They are stored relative to the working directory, in
+``.config/spiker_playback``.
+"""
+import json
+import time
+from pathlib import Path
+
+from eyeplay import model
+from eyeplay.model import MODEL_PATH
+from eyeplay.pipeline import DEFAULT_PARAMS
+from eyeplay.session import available_ports
+
+DETECTOR_PATH = ".config/spiker_playback/detector.json"
+
+
+def read_detector(path=DETECTOR_PATH):
+    """Return the :class:`eyeplay.pipeline.DetectorParams` saved at
+    ``path``, with defaults for those missing from the file, or the
+    defaults when there is no file.
+
+    Parameters the detector no longer has, such as ``blink_peak_gap``
+    before it was given in seconds, are left out with a warning.
+    """
+    try:
+        with open(path) as file:
+            saved = json.load(file)
+    except FileNotFoundError:
+        return DEFAULT_PARAMS
+    unknown = sorted(set(saved) - set(DEFAULT_PARAMS._fields))
+    if unknown:
+        print(f"{time.time()}: {path}: ignoring unknown detector "
+              f"parameters: {', '.join(unknown)}")
+    return DEFAULT_PARAMS._replace(**{
+        name: value for name, value in saved.items() if name not in unknown})
+
+
+def write_detector(params, path=DETECTOR_PATH):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(params._asdict(), file, indent=2)
+
+
+def read_model(path=MODEL_PATH):
+    """Return the :class:`eyeplay.model.Model` saved at ``path``, or None
+    to classify by the rules of :func:`eyeplay.pipeline.classify_features`
+    when there is no file.
+    """
+    try:
+        return model.load(path)
+    except FileNotFoundError:
+        return None
+
+
+class Config:
+
+    PORT_PATH = ".config/spiker_playback/port"
+    KEYMAP_PATH = ".config/spiker_playback/keymap.json"
+    DETECTOR_PATH = DETECTOR_PATH
+    MODEL_PATH = MODEL_PATH
+
+    def __init__(self):
+        self.load_port()
+        self.load_keymap()
+        self.load_detector()
+        self.load_model()
+
+    def load_port(self):
+        try:
+            with open(self.PORT_PATH) as file:
+                self.port = file.read()
+            if self.port not in available_ports():
+                self.port = None
+        except FileNotFoundError:
+            self.port = None
+
+    def set_port(self, port):
+        self.port = port
+        with open(self.PORT_PATH, "w") as file:
+            file.write(port)
+
+    def load_keymap(self):
+        try:
+            with open(self.KEYMAP_PATH) as file:
+                self.keymap = json.load(file)
+        except FileNotFoundError:
+            self.keymap = {
+                "blink": "Play/Pause",
+                "left": "Previous",
+                "right": "Next",
+            }
+            self.dump_keymap()
+
+    def dump_keymap(self):
+        parent = Path(self.KEYMAP_PATH).parent
+        if not parent.exists():
+            parent.mkdir(parents=True)
+        with open(self.KEYMAP_PATH, "w") as file:
+            json.dump(self.keymap, file)
+
+    def set_keymap(self, movement, key):
+        self.keymap[movement] = key
+        self.dump_keymap()
+
+    def load_detector(self):
+        self.detector = read_detector(self.DETECTOR_PATH)
+
+    def load_model(self):
+        self.model = read_model(self.MODEL_PATH)
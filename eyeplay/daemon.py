@@ -0,0 +1,157 @@
+"""Headless eyePlay: serial, filter, classify and act, without a GUI.
+
+Nothing imports Tk or matplotlib, and pynput and spotipy are imported only
+when a mapped action first needs them, so the daemon starts quickly and
+runs without a display, e.g. on a machine serving several stations.
+
+Run it with the port and keymap saved by the application,
+
+    python -m eyeplay.daemon
+
+or with explicit ports, or a JSON list of stations, see
+:meth:`eyeplay.session.SessionManager.from_config`,
+
+    python -m eyeplay.daemon --port /dev/ttyUSB0 --port /dev/ttyUSB1
+    python -m eyeplay.daemon --stations stations.json
+"""
+import argparse
+import json
+import sys
+import time
+
+from eyeplay import metrics, spotify
+from eyeplay.actions import COALESCE, Actions, uses_spotify
+from eyeplay.channel import DROP_OLDEST, POLICIES
+from eyeplay.config import (
+    DETECTOR_PATH,
+    MODEL_PATH,
+    Config,
+    read_detector,
+    read_model,
+)
+from eyeplay.dispatcher import ActionDispatcher
+from eyeplay.pipeline import EyeMovement
+from eyeplay.session import ProcessSession, Session, SessionManager
+
+
+class Daemon:
+    """Dispatch the movements of every session to the mapped actions.
+
+    As in the application, a double blink turns the actions of its session
+    on or off.
+    """
+
+    def __init__(self, manager, dispatcher, enabled=False):
+        self.manager = manager
+        self.dispatcher = dispatcher
+        self.enabled = {session.name: enabled for session in manager}
+        for session in manager:
+            session.on_movement = self.action
+
+    def action(self, session, movement):
+        print(f"{time.time()}: {session.name}: {movement.value}")
+        key = session.keymap.get(movement.value)
+        if movement == EyeMovement.DOUBLE_BLINK:
+            self.enabled[session.name] = not self.enabled[session.name]
+            state = "enabled" if self.enabled[session.name] else "disabled"
+            print(f"{time.time()}: {session.name}: actions {state}")
+        if key is not None and self.enabled[session.name]:
+            self.dispatcher.submit(key)
+            if session.recorder is not None:
+                session.recorder.event("action", action=key,
+                                       movement=movement.value)
+
+    def start(self):
+        self.dispatcher.start()
+        self.manager.start()
+        return self
+
+    def stop(self, timeout=None):
+        self.manager.stop(timeout)
+        self.dispatcher.stop(timeout)
+
+    def stats(self):
+        return {
+            "sessions": self.manager.stats(),
+            "actions": self.dispatcher.stats(),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m eyeplay.daemon",
+        description="Run eyePlay without a GUI.",
+    )
+    parser.add_argument("--port", action="append", default=[],
+                        help="serial port of a SpikerBox, may be repeated, "
+                             "defaults to the port saved by the application")
+    parser.add_argument("--stations", metavar="PATH",
+                        help="JSON file listing the stations to serve")
+    parser.add_argument("--enabled", action="store_true",
+                        help="start with the actions on, instead of waiting "
+                             "for a double blink")
+    parser.add_argument("--overload", choices=POLICIES, default=DROP_OLDEST,
+                        help="what to drop when the classifier falls behind")
+    parser.add_argument("--metrics-port", type=int, default=metrics.PORT,
+                        help="serve Prometheus metrics on this local port, "
+                             "0 to turn off")
+    parser.add_argument("--stats", type=float, metavar="SECONDS",
+                        help="print the counters every SECONDS")
+    parser.add_argument("--reader-process", action="store_true",
+                        help="read each port in its own process, see "
+                             "ProcessSession; needs fork, so not on Windows")
+    parser.add_argument("--detector", default=DETECTOR_PATH,
+                        help="detector parameters exported by eyeplay.sweep")
+    parser.add_argument("--record", metavar="DIR",
+                        help="record the samples, movements and actions of "
+                             "every session in DIR, see eyeplay.recorder")
+    parser.add_argument("--model", default=MODEL_PATH,
+                        help="classifier exported by eyeplay.model, the "
+                             "built-in rules when missing")
+    args = parser.parse_args(argv)
+
+    params = read_detector(args.detector)
+    model = read_model(args.model)
+    # sessions are created before any thread, as reader processes are forked
+    factory = ProcessSession if args.reader_process else Session
+    if args.record and args.reader_process:
+        parser.error("--record needs the threaded reader")
+    if args.stations:
+        manager = SessionManager.from_config(args.stations, params=params,
+                                             model=model, record=args.record,
+                                             factory=factory)
+    else:
+        config = Config()
+        ports = args.port or [config.port]
+        if None in ports:
+            parser.error("no device found, select one in the application "
+                         "or pass --port")
+        manager = SessionManager(factory(port, config.keymap,
+                                         overload=args.overload,
+                                         params=params, model=model,
+                                         record=args.record)
+                                 for port in ports)
+
+    actions = Actions()
+    dispatcher = ActionDispatcher(actions, coalesce=COALESCE)
+    daemon = Daemon(manager, dispatcher, enabled=args.enabled).start()
+    if any(uses_spotify(session.keymap) for session in manager):
+        spotify.authenticate()
+    if args.metrics_port:
+        metrics.serve(port=args.metrics_port)
+    print(f"{time.time()}: serving {', '.join(s.name for s in manager)}",
+          file=sys.stderr)
+    try:
+        while True:
+            time.sleep(args.stats or 60)
+            if args.stats:
+                print(json.dumps(daemon.stats()), file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop(timeout=1.0)
+        actions.close()
+
+
+if __name__ == "__main__":
+    main()
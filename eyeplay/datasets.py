@@ -0,0 +1,164 @@
+"""Loading of the recordings in ``analysis/data``.
+
+Parsing a 10 MB CSV takes seconds, so every recording is converted once to
+a ``.npy`` file in a cache directory and memory-mapped from there on. The
+cache is keyed by the path, size and modification time of the source, or
+by its content with ``use_hash=True``::
+
+    from eyeplay import datasets
+
+    for recording in datasets.load_all():
+        print(recording.path, len(recording.samples), recording.laps)
+
+Run ``python -m eyeplay.datasets`` to fill the cache ahead of time.
+Sessions recorded by :mod:`eyeplay.recorder` are memory-mapped in place.
+"""
+import collections
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy.io import wavfile
+
+from eyeplay import recorder
+
+DATA_DIR = Path(__file__).parent.parent / "analysis" / "data"
+CACHE_DIR = Path(os.environ.get("EYEPLAY_CACHE",
+                                Path.home() / ".cache" / "eyeplay"))
+
+Recording = collections.namedtuple(
+    "Recording", ["path", "samples", "sample_freq", "laps"])
+
+
+def read_recording(path):
+    """Return the samples of a CSV, WAV or recorded session and its sample
+    rate.
+    """
+    path = Path(path)
+    if path.suffix == recorder.SAMPLES_SUFFIX:
+        samples, sample_freq, _ = recorder.read(path)
+        return samples, sample_freq
+    if path.suffix.lower() == ".wav":
+        sample_freq, samples = wavfile.read(path)
+        if samples.ndim > 1:
+            samples = samples[:, 0]
+        return samples, sample_freq
+    time_, samples = np.loadtxt(path, delimiter=",", usecols=(0, 1)).T
+    # some recordings were exported back to front
+    if time_[-1] < time_[0]:
+        time_ = time_[::-1]
+        samples = samples[::-1]
+    sample_freq = int(round(1 / np.median(np.diff(time_))))
+    # the CSV files were exported from 16-bit WAV files
+    if np.all(samples == np.round(samples)) \
+            and np.all(np.abs(samples) <= np.iinfo(np.int16).max):
+        samples = samples.astype(np.int16)
+    return samples, sample_freq
+
+
+def read_laps(path, laps_name="laps.txt"):
+    """Return the times of the labelled events in a recording, if any.
+
+    Lap times are listed under the recording name in a ``laps.txt`` next to
+    the recording, as the time since the previous lap.
+    """
+    path = Path(path)
+    laps_path = path.parent / laps_name
+    if not laps_path.exists():
+        return None
+    laps = []
+    found = False
+    with open(laps_path) as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                pass
+            elif not line.replace(".", "").isnumeric():
+                if found:
+                    break
+                found = line == path.stem
+            elif found:
+                laps.append(float(line))
+    return np.cumsum(laps) if laps else None
+
+
+def find_recordings(paths):
+    """Expand directories into recordings, preferring WAV over CSV."""
+    for path in map(Path, paths):
+        if not path.is_dir():
+            yield path
+            continue
+        for found in sorted(path.glob("**/*.csv")) + sorted(
+                path.glob("**/*.wav")) + sorted(
+                path.glob(f"**/*{recorder.SAMPLES_SUFFIX}")):
+            if found.suffix == ".csv" and found.with_suffix(".wav").exists():
+                continue
+            yield found
+
+
+def cache_key(path, use_hash=False):
+    path = Path(path).resolve()
+    digest = hashlib.sha256(str(path).encode())
+    if use_hash:
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+    else:
+        stat = path.stat()
+        digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return f"{path.stem}-{digest.hexdigest()[:16]}"
+
+
+def load(path, cache_dir=CACHE_DIR, use_hash=False):
+    """Return a recording with its samples memory-mapped from the cache.
+
+    Raises ValueError when the recording cannot be parsed.
+    """
+    path = Path(path)
+    if path.suffix == recorder.SAMPLES_SUFFIX:
+        samples, sample_freq = read_recording(path)
+        return Recording(path, samples, sample_freq, read_laps(path))
+    cache_dir = Path(cache_dir)
+    key = cache_key(path, use_hash)
+    samples_path = cache_dir / f"{key}.npy"
+    meta_path = cache_dir / f"{key}.json"
+    try:
+        with open(meta_path) as file:
+            sample_freq = json.load(file)["sample_freq"]
+        samples = np.load(samples_path, mmap_mode="r")
+    except (FileNotFoundError, ValueError, KeyError):
+        samples, sample_freq = read_recording(path)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        # write under a temporary name so readers never see half a file
+        partial = cache_dir / f"{key}.partial.npy"
+        np.save(partial, np.ascontiguousarray(samples))
+        os.replace(partial, samples_path)
+        with open(meta_path, "w") as file:
+            json.dump({"source": str(path), "sample_freq": int(sample_freq)},
+                      file)
+        samples = np.load(samples_path, mmap_mode="r")
+    return Recording(path, samples, sample_freq, read_laps(path))
+
+
+def load_all(paths=(DATA_DIR,), cache_dir=CACHE_DIR, use_hash=False):
+    """Load every readable recording, skipping those that cannot be parsed
+    such as Git LFS pointers.
+    """
+    recordings = []
+    for path in find_recordings(paths):
+        try:
+            recordings.append(load(path, cache_dir, use_hash))
+        except ValueError:
+            continue
+    return recordings
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    recordings = load_all(sys.argv[1:] or (DATA_DIR,))
+    print(f"loaded {len(recordings)} recordings "
+          f"in {time.perf_counter() - start:.2f} s")
@@ -0,0 +1,54 @@
+"""Decoder for the SpikerBox serial stream.
+
+Every sample is sent as a two-byte frame. The first byte has its high bit set
+and carries the upper seven bits of the sample, the second byte carries the
+lower seven bits.
+"""
+import numpy as np
+
+SYNC_MASK = 0x80
+DATA_MASK = 0x7F
+FRAME_SIZE = 2
+
+
+class FrameDecoder:
+    """Decode raw serial reads into samples.
+
+    A sync byte at the very end of a read is kept and paired with the first
+    byte of the next read, so frames split across reads are not lost.
+    ``dropped`` counts the bytes that did not belong to any frame.
+    """
+
+    def __init__(self):
+        self._carry = None
+        self.dropped = 0
+
+    def reset(self):
+        self._carry = None
+
+    def decode(self, raw):
+        buffer = np.frombuffer(raw, dtype=np.uint8)
+        if self._carry is not None:
+            buffer = np.concatenate(([self._carry], buffer))
+            self._carry = None
+        if len(buffer) == 0:
+            return np.empty(0, dtype=np.int16)
+
+        sync = buffer > DATA_MASK
+        if sync[-1]:
+            self._carry = buffer[-1]
+        # a frame is a sync byte immediately followed by a data byte
+        high = np.flatnonzero(sync[:-1] & ~sync[1:])
+        self.dropped += (len(buffer) - FRAME_SIZE * len(high)
+                         - (self._carry is not None))
+        return (((buffer[high] & DATA_MASK).astype(np.int16) << 7)
+                | buffer[high + 1])
+
+
+def encode_frames(samples):
+    """Encode samples into the two-byte frames sent by the device."""
+    samples = np.asarray(samples, dtype=np.int16)
+    frames = np.empty(len(samples) * FRAME_SIZE, dtype=np.uint8)
+    frames[0::2] = SYNC_MASK | ((samples >> 7) & DATA_MASK)
+    frames[1::2] = samples & DATA_MASK
+    return frames.tobytes()
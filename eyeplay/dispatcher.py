@@ -0,0 +1,167 @@
+"""Asynchronous dispatch of actions to the playback backends.
+
+Handlers such as the Spotify calls block on HTTP round trips, so they run
+on worker threads instead of the thread that classifies eye movements.
+"""
+import collections
+import threading
+import time
+
+from eyeplay.metrics import REGISTRY
+
+
+class Command:
+
+    __slots__ = ("key", "created")
+
+    def __init__(self, key, created):
+        self.key = key
+        self.created = created
+
+
+class ActionStats:
+
+    __slots__ = ("count", "total_latency", "max_latency")
+
+    def __init__(self):
+        self.count = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def add(self, latency):
+        self.count += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "mean_latency": self.total_latency / max(self.count, 1),
+            "max_latency": self.max_latency,
+        }
+
+
+class ActionDispatcher:
+    """Bounded queue of actions served by worker threads.
+
+    ``handlers`` maps action keys to callables. Keys in ``coalesce`` are
+    called with the number of repeated commands waiting at the head of the
+    queue, e.g. ``volume_up(3)`` instead of three calls. When the queue is
+    full the oldest command is dropped, and commands older than
+    ``deadline`` seconds are discarded instead of run, leaving the fresh
+    repeats of a coalesced group to run.
+    """
+
+    def __init__(self, handlers, maxsize=16, deadline=2.0, workers=1,
+                 coalesce=(), verbose=True, registry=REGISTRY):
+        self.handlers = handlers
+        self.maxsize = maxsize
+        self.deadline = deadline
+        self.coalesce = frozenset(coalesce)
+        self.verbose = verbose
+        self.dropped = 0
+        self.stale = 0
+        self.errors = 0
+        self.action_stats = collections.defaultdict(ActionStats)
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._threads = [threading.Thread(target=self._work, daemon=True)
+                         for _ in range(workers)]
+        self.registry = registry
+        for name, help, func, kind in (
+                ("eyeplay_actions_queued", "Actions waiting for a worker",
+                 self.__len__, "gauge"),
+                ("eyeplay_actions_dropped_total",
+                 "Actions dropped from a full queue",
+                 lambda: self.dropped, "counter"),
+                ("eyeplay_actions_stale_total",
+                 "Actions discarded past their deadline",
+                 lambda: self.stale, "counter"),
+                ("eyeplay_action_errors_total", "Actions that failed",
+                 lambda: self.errors, "counter")):
+            registry.callback(name, help, func, kind)
+
+    def __len__(self):
+        return len(self._queue)
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def submit(self, key, created=None):
+        if created is None:
+            created = time.perf_counter()
+        with self._condition:
+            if len(self._queue) >= self.maxsize:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(Command(key, created))
+            self._condition.notify()
+
+    def _next(self):
+        with self._condition:
+            while not self._queue:
+                if self._closed:
+                    return [], 0
+                self._condition.wait()
+            commands = [self._queue.popleft()]
+            if commands[0].key in self.coalesce:
+                while self._queue and self._queue[0].key == commands[0].key:
+                    commands.append(self._queue.popleft())
+            return commands, len(self._queue)
+
+    def _work(self):
+        while True:
+            commands, depth = self._next()
+            if not commands:
+                return
+            now = time.perf_counter()
+            fresh = [command for command in commands
+                     if now - command.created <= self.deadline]
+            if len(fresh) < len(commands):
+                with self._condition:
+                    self.stale += len(commands) - len(fresh)
+            if not fresh:
+                continue
+            command, steps = fresh[0], len(fresh)
+            try:
+                # handlers may be created, and fail, on first use
+                handler = self.handlers[command.key]
+                if command.key in self.coalesce:
+                    handler(steps)
+                else:
+                    handler()
+            except Exception as error:
+                with self._condition:
+                    self.errors += 1
+                print(f"{time.time()}: {command.key} failed: {error!r}")
+                continue
+            latency = time.perf_counter() - command.created
+            with self._condition:
+                self.action_stats[command.key].add(latency)
+            self.registry.histogram(
+                "eyeplay_action_seconds",
+                "Seconds from submitting an action to its completion",
+                action=command.key).observe(latency)
+            if self.verbose:
+                print(f"{time.time()}: {command.key} x{steps} "
+                      f"in {latency * 1000:.0f} ms, {depth} queued")
+
+    def stats(self):
+        return {
+            "queued": len(self._queue),
+            "dropped": self.dropped,
+            "stale": self.stale,
+            "errors": self.errors,
+            "actions": {key: stats.as_dict()
+                        for key, stats in self.action_stats.items()},
+        }
@@ -0,0 +1,325 @@
+"""Accuracy and latency of the classifier over the labelled recordings.
+
+Every recording in ``analysis/data`` is replayed through the production
+pipeline. The label of a recording comes from its path, and recordings
+with laps in ``laps.txt`` are matched event by event::
+
+    python -m eyeplay.evaluate --output results.json --baseline old.json
+
+The command exits with a non-zero status when the results regress against
+the baseline.
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from functools import partial
+
+import numpy as np
+
+from eyeplay import datasets
+from eyeplay.config import read_detector, read_model
+from eyeplay.datasets import DATA_DIR, find_recordings
+from eyeplay.pipeline import Classifier, EyeMovement, holds_for
+from eyeplay.replay import replay
+from eyeplay.zerocrossing import THRESHOLD, ZeroCrossingTrigger
+
+NONE = "none"
+CLASSES = tuple(movement.value for movement in EyeMovement) + (NONE,)
+SWAPPED_WEEKS = (6,)  # the electrodes were swapped in these weeks
+LAP_TOLERANCE = 2.5  # seconds from a lap to the detection of its event
+
+# regressions tolerated against a baseline
+ACCURACY_TOLERANCE = 0.02
+LATENCY_TOLERANCE = 0.1
+THROUGHPUT_TOLERANCE = 0.25
+
+
+def label_of(path):
+    """Return the true movement of a recording, ``"none"`` for recordings
+    without events, or None for unlabelled recordings.
+    """
+    text = str(path).lower()
+    if "non_event" in text or "nonevent" in text:
+        return NONE
+    if "test" in text:
+        return None
+    for label in ("left", "right", "blink"):
+        if label in text:
+            break
+    else:
+        return None
+    week = re.search(r"week(\d+)", text)
+    if week and int(week.group(1)) in SWAPPED_WEEKS:
+        label = {"left": "right", "right": "left"}.get(label, label)
+    if "double" in text:
+        label = f"double_{label}"
+    return label
+
+
+def match_laps(detections, laps, tolerance=LAP_TOLERANCE):
+    """Pair labelled events with the first detection after each of them.
+
+    Returns the pairs of lap and detection index, with None for laps that
+    were missed and for detections without a lap.
+    """
+    pairs = []
+    matched = set()
+    for lap in laps:
+        for i, detection in enumerate(detections):
+            if i not in matched and lap <= detection.seconds <= lap + tolerance:
+                matched.add(i)
+                pairs.append((lap, i))
+                break
+        else:
+            pairs.append((lap, None))
+    pairs.extend((None, i) for i in range(len(detections))
+                 if i not in matched)
+    return pairs
+
+
+def scores(confusion):
+    """Return the precision and recall of each class from the confusion
+    matrix, with true classes in rows and predictions in columns.
+    """
+    confusion = np.asarray(confusion)
+    result = {}
+    for i, name in enumerate(CLASSES):
+        if name == NONE:
+            continue
+        predicted = confusion[:, i].sum()
+        actual = confusion[i].sum()
+        result[name] = {
+            "precision": confusion[i, i] / predicted if predicted else None,
+            "recall": confusion[i, i] / actual if actual else None,
+            "support": int(actual),
+        }
+    return result
+
+
+def summary(values):
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return None
+    return {
+        "mean": float(np.mean(values)),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "max": float(np.max(values)),
+    }
+
+
+def evaluate(paths, classifier_factory=Classifier, tolerance=LAP_TOLERANCE,
+             signals=None):
+    """Replay the recordings under ``paths`` and score the detections.
+
+    ``signals``, if given, returns the filtered signal of a
+    :class:`eyeplay.datasets.Recording`, which is then classified without
+    filtering it again.
+    """
+    index = {name: i for i, name in enumerate(CLASSES)}
+    confusion = np.zeros((len(CLASSES), len(CLASSES)), dtype=int)
+    files = []
+    latency_samples = []
+    latency_signal_seconds = []
+    lap_latency = []
+    response = {}
+    compute = []
+    signal_seconds = 0.0
+    replay_seconds = 0.0
+
+    for path in find_recordings(paths):
+        try:
+            recording = datasets.load(path)
+        except ValueError:
+            continue
+        _, samples, sample_freq, laps = recording
+        label = label_of(path)
+
+        start = time.perf_counter()
+        if signals is None:
+            detections = replay(samples, sample_freq, classifier_factory())
+        else:
+            detections = replay(signals(recording), sample_freq,
+                                classifier_factory(), filtered=True)
+        replay_seconds += time.perf_counter() - start
+        signal_seconds += len(samples) / sample_freq
+
+        for detection in detections:
+            latency = detection.sample - detection.event_end
+            latency_samples.append(latency)
+            latency_signal_seconds.append(latency / sample_freq)
+            compute.append(detection.compute)
+            response.setdefault(detection.movement.value, []).append(
+                (detection.sample - detection.last_peak) / sample_freq)
+
+        predicted = [detection.movement.value for detection in detections]
+        if label is None:
+            pass
+        elif laps is not None:
+            for lap, i in match_laps(detections, laps, tolerance):
+                truth = NONE if lap is None else label
+                guess = NONE if i is None else predicted[i]
+                confusion[index[truth], index[guess]] += 1
+                if lap is not None and i is not None:
+                    lap_latency.append(detections[i].seconds - lap)
+        else:
+            for guess in predicted:
+                confusion[index[label], index[guess]] += 1
+
+        files.append({
+            "path": str(path),
+            "label": label,
+            "laps": None if laps is None else len(laps),
+            "detections": {name: predicted.count(name) for name in CLASSES
+                           if name in predicted},
+        })
+
+    return {
+        "files": files,
+        "classes": scores(confusion),
+        "confusion": {"labels": CLASSES, "matrix": confusion.tolist()},
+        # in the time of the signal, but for the compute time of the
+        # classifier, which is the only one measured on the clock
+        "latency": {
+            "samples": summary(latency_samples),
+            "signal_seconds": summary(latency_signal_seconds),
+            "from_lap_seconds": summary(lap_latency),
+            "compute_seconds": summary(compute),
+        },
+        "response_seconds": {movement: summary(seconds)
+                             for movement, seconds in response.items()},
+        "throughput": signal_seconds / replay_seconds if replay_seconds
+        else None,
+    }
+
+
+def with_trigger(classifier_factory, trigger_factory):
+    """Return ``classifier_factory`` creating classifiers with a new
+    trigger from ``trigger_factory`` each.
+    """
+    def create(**kwargs):
+        return classifier_factory(trigger=trigger_factory(), **kwargs)
+    return create
+
+
+def macro(results, metric):
+    values = [scores[metric] for scores in results["classes"].values()
+              if scores[metric] is not None]
+    return float(np.mean(values)) if values else None
+
+
+def regressions(results, baseline):
+    """Return a description of every regression against the baseline."""
+    found = []
+    for metric in ("precision", "recall"):
+        new, old = macro(results, metric), macro(baseline, metric)
+        if new is not None and old is not None \
+                and new < old - ACCURACY_TOLERANCE:
+            found.append(f"macro {metric} fell from {old:.3f} to {new:.3f}")
+    new = (results["latency"]["signal_seconds"] or {}).get("mean")
+    old = (baseline["latency"]["signal_seconds"] or {}).get("mean")
+    if new is not None and old is not None \
+            and new > old * (1 + LATENCY_TOLERANCE):
+        found.append(f"mean latency rose from {old:.3f} s to {new:.3f} s "
+                     "of signal")
+    new, old = results["throughput"], baseline["throughput"]
+    if new is not None and old is not None \
+            and new < old * (1 - THROUGHPUT_TOLERANCE):
+        found.append(f"throughput fell from {old:.0f}x to {new:.0f}x "
+                     "real time")
+    return found
+
+
+def print_results(results):
+    print(f"{'class':>14} {'precision':>9} {'recall':>7} {'support':>7}")
+    for name, score in results["classes"].items():
+        precision, recall = score["precision"], score["recall"]
+        print(f"{name:>14} "
+              f"{'-' if precision is None else f'{precision:.3f}':>9} "
+              f"{'-' if recall is None else f'{recall:.3f}':>7} "
+              f"{score['support']:>7}")
+    print()
+    labels = results["confusion"]["labels"]
+    print(" " * 14 + "".join(f"{label[:8]:>9}" for label in labels))
+    for label, row in zip(labels, results["confusion"]["matrix"]):
+        print(f"{label:>14}" + "".join(f"{count:>9}" for count in row))
+    print()
+    for name, latency in results["latency"].items():
+        if latency is not None:
+            print(f"latency {name}: mean {latency['mean']:.4g}, "
+                  f"p95 {latency['p95']:.4g}, max {latency['max']:.4g}")
+    for movement, response in results["response_seconds"].items():
+        print(f"response {movement}: mean {response['mean']:.3f} s, "
+              f"p95 {response['p95']:.3f} s")
+    if results["throughput"] is not None:
+        print(f"throughput: {results['throughput']:.0f}x real time")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", default=[DATA_DIR],
+                        help="recordings or directories of them")
+    parser.add_argument("--output", help="save the results as JSON")
+    parser.add_argument("--baseline",
+                        help="results of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=LAP_TOLERANCE,
+                        help="seconds from a lap to its detection")
+    parser.add_argument("--speculative", action="store_true",
+                        help="decide before events end, see Classifier")
+    parser.add_argument("--keymap",
+                        help="keymap deciding which movements wait for "
+                             "their double form when speculative")
+    parser.add_argument("--detector",
+                        help="detector parameters exported by "
+                             "eyeplay.sweep, the defaults otherwise")
+    parser.add_argument("--model",
+                        help="classifier exported by eyeplay.model, the "
+                             "built-in rules otherwise")
+    parser.add_argument("--zero-crossings", type=int, nargs="?",
+                        const=THRESHOLD, metavar="THRESHOLD",
+                        help="detect events by zero crossings instead of "
+                             f"variance (default threshold: {THRESHOLD})")
+    args = parser.parse_args(argv)
+
+    classifier_factory = Classifier
+    if args.detector:
+        classifier_factory = partial(Classifier,
+                                     params=read_detector(args.detector))
+    if args.model:
+        model = read_model(args.model)
+        if model is None:
+            sys.exit(f"No model found at {args.model}")
+        classifier_factory = partial(classifier_factory, model=model)
+    if args.speculative:
+        keymap = {}
+        if args.keymap:
+            with open(args.keymap) as file:
+                keymap = json.load(file)
+        holds = holds_for(keymap)
+        classifier_factory = partial(classifier_factory, holds=holds)
+    if args.zero_crossings is not None:
+        classifier_factory = with_trigger(
+            classifier_factory,
+            partial(ZeroCrossingTrigger, args.zero_crossings))
+    results = evaluate(args.paths, classifier_factory, args.tolerance)
+    if not results["files"]:
+        sys.exit("No readable recordings found, "
+                 "have the Git LFS objects been pulled?")
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        found = regressions(results, baseline)
+        for regression in found:
+            print(f"regression: {regression}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
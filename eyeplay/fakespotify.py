@@ -0,0 +1,122 @@
+"""Local stand-in for the playback endpoints of the Spotify Web API.
+
+Point a client at it to exercise the Spotify backend without an account or
+network access::
+
+    with FakeSpotify() as fake:
+        sp = spotipy.Spotify(auth="fake")
+        sp.prefix = fake.url
+        SpotifyPlayback(sp).playpause()
+        print(fake.requests)
+
+Run ``python -m eyeplay.fakespotify`` to serve it on its own.
+"""
+import collections
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeSpotify:
+    """Playback state behind a local HTTP server.
+
+    ``latency`` seconds are added to every response to mimic the round trip
+    to the real API. ``requests`` counts the requests per method and path.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0,
+                 is_playing=False, volume=50, active=True):
+        self.latency = latency
+        self.is_playing = is_playing
+        self.volume = volume
+        self.active = active
+        self.track = 0
+        self.requests = collections.Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        host, port = self._server.server_address[:2]
+        self.url = f"http://{host}:{port}/v1/"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever,
+                         daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def state(self):
+        if not self.active:
+            return None
+        return {
+            "is_playing": self.is_playing,
+            "progress_ms": 0,
+            "item": {"id": f"track{self.track}"},
+            "device": {"id": "fake", "volume_percent": self.volume},
+        }
+
+    def handle(self, method, path, query):
+        """Apply a request and return the status code and JSON body."""
+        with self._lock:
+            self.requests[f"{method} {path}"] += 1
+            match method, path:
+                case "GET", "/v1/me/player":
+                    state = self.state()
+                    return (200, state) if state else (204, None)
+                case "PUT", "/v1/me/player/play":
+                    self.is_playing = True
+                case "PUT", "/v1/me/player/pause":
+                    self.is_playing = False
+                case "PUT", "/v1/me/player/volume":
+                    self.volume = int(query["volume_percent"][0])
+                case "POST", "/v1/me/player/next":
+                    self.track += 1
+                case "POST", "/v1/me/player/previous":
+                    self.track -= 1
+                case _:
+                    return 404, {"error": {"status": 404,
+                                           "message": "Not found"}}
+            return 204, None
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def _respond(self):
+                url = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(length)
+                if fake.latency:
+                    time.sleep(fake.latency)
+                status, body = fake.handle(self.command, url.path,
+                                           parse_qs(url.query))
+                payload = json.dumps(body).encode() if body else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_PUT = do_POST = _respond
+
+            def log_message(self, *_):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    with FakeSpotify(port=3001) as fake:
+        print(f"Serving a fake Spotify API at {fake.url}")
+        threading.Event().wait()
@@ -0,0 +1,119 @@
+"""Peak features of an event, shared by the classifier and the analysis.
+
+An event is described by its peaks of at least ``PROMINENCE``, high and
+low, and the peaks of the event smoothed over ``SMOOTH_WINDOW_SIZE``
+samples. :func:`extract` computes the features of one event, as the live
+classifier does, and :func:`extract_many` those of many clips, on a pool of
+processes, for the notebooks.
+
+``find_peaks(x, prominence=p)`` keeps the local maxima of ``x`` whose
+prominence is at least ``p``. So :func:`candidates` finds the maxima and
+their prominences once, and the features for any prominence are a
+threshold away. :func:`sweep` uses that to compute the features over a
+range of prominences at the cost of one.
+"""
+import collections
+import multiprocessing
+
+import numpy as np
+from scipy.signal import find_peaks, peak_prominences
+
+PROMINENCE = 50
+SMOOTH_WINDOW_SEC = 0.05
+# at the 10 kHz of the device, see eyeplay.pipeline.SERIAL_FREQ
+SMOOTH_WINDOW_SIZE = int(SMOOTH_WINDOW_SEC * 10000)
+
+Candidates = collections.namedtuple("Candidates", [
+    "length",
+    "high", "high_prominence",
+    "low", "low_prominence",
+    "smoothed", "smoothed_prominence",
+])
+
+FEATURES = (
+    ("length", np.int64),
+    ("n_high", np.int64),  # peaks
+    ("n_low", np.int64),  # troughs
+    ("n_peak", np.int64),  # both
+    ("min_diff_peak", np.int64),  # closest peaks, 0 with fewer than two
+    ("high_mean", np.float64),  # mean position, nan without peaks
+    ("low_mean", np.float64),
+    ("n_smoothed", np.int64),  # peaks of the smoothed event
+    ("last_peak", np.int64),  # position, -1 without peaks
+)
+FEATURE_DTYPE = np.dtype(list(FEATURES))
+Features = collections.namedtuple("Features", [name for name, _ in FEATURES])
+
+
+def _maxima(x):
+    peaks, _ = find_peaks(x)
+    return peaks, peak_prominences(x, peaks)[0]
+
+
+def candidates(event, smooth_size=SMOOTH_WINDOW_SIZE):
+    """Return every peak of ``event`` with its prominence."""
+    event = np.asarray(event, dtype=np.float64)
+    smooth_filter = np.ones(smooth_size) / smooth_size
+    smoothed = np.convolve(event, smooth_filter, mode="valid")
+    return Candidates(len(event), *_maxima(event), *_maxima(-event),
+                      *_maxima(smoothed))
+
+
+def features(candidates, prominence=PROMINENCE):
+    """Return the :class:`Features` of peaks of at least ``prominence``."""
+    high = candidates.high[candidates.high_prominence >= prominence]
+    low = candidates.low[candidates.low_prominence >= prominence]
+    peaks = np.sort(np.concatenate((high, low)))
+    return Features(
+        length=candidates.length,
+        n_high=len(high),
+        n_low=len(low),
+        n_peak=len(peaks),
+        min_diff_peak=int(np.min(np.diff(peaks))) if len(peaks) > 1 else 0,
+        high_mean=float(np.mean(high)) if len(high) else np.nan,
+        low_mean=float(np.mean(low)) if len(low) else np.nan,
+        n_smoothed=int(np.count_nonzero(
+            candidates.smoothed_prominence >= prominence)),
+        last_peak=int(peaks[-1]) if len(peaks) else -1,
+    )
+
+
+def extract(event, prominence=PROMINENCE, smooth_size=SMOOTH_WINDOW_SIZE):
+    return features(candidates(event, smooth_size), prominence)
+
+
+def _sweep_one(args):
+    event, prominences, smooth_size = args
+    found = candidates(event, smooth_size)
+    return [tuple(features(found, prominence)) for prominence in prominences]
+
+
+def sweep(events, prominences, smooth_size=SMOOTH_WINDOW_SIZE,
+          processes=None, chunksize=32):
+    """Return the features of every event for every prominence, as a
+    structured array of ``len(prominences)`` rows by ``len(events)``.
+
+    The events are spread over ``processes`` worker processes, all the
+    CPUs by default, or computed in this process when ``processes`` is 1.
+    """
+    prominences = list(np.atleast_1d(prominences))
+    jobs = ((event, prominences, smooth_size) for event in events)
+    if processes == 1:
+        rows = list(map(_sweep_one, jobs))
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            rows = pool.map(_sweep_one, jobs, chunksize)
+    result = np.empty((len(prominences), len(rows)), dtype=FEATURE_DTYPE)
+    for j, row in enumerate(rows):
+        for i, values in enumerate(row):
+            result[i, j] = values
+    return result
+
+
+def extract_many(events, prominence=PROMINENCE,
+                 smooth_size=SMOOTH_WINDOW_SIZE, processes=None,
+                 chunksize=32):
+    """Return the features of every event as a structured array, which
+    ``pandas.DataFrame`` takes as is.
+    """
+    return sweep(events, [prominence], smooth_size, processes, chunksize)[0]
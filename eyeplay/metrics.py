@@ -0,0 +1,206 @@
+"""Always-on instrumentation of the pipeline.
+
+Each stage records its duration in a :class:`Histogram` and its throughput
+in counters, all kept in a :class:`Registry`. An observation is a bisect
+and an increment, cheap enough to leave on in production. The registry is
+rendered in the Prometheus text format, served over HTTP by :func:`serve`,
+so that overload can be diagnosed on a running station::
+
+    curl localhost:9477/metrics
+"""
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PORT = 9477
+# upper bounds in seconds, from 10 us to 10 s
+BUCKETS = tuple(m * 10.0 ** e for e in range(-5, 1) for m in (1, 2.5, 5)) + (
+    10.0,)
+
+
+class Counter:
+
+    kind = "counter"
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self):
+        return [("", {}, self.value)]
+
+
+class Callback:
+    """A counter or gauge read from ``func`` when rendered."""
+
+    def __init__(self, func, kind="gauge"):
+        self.func = func
+        self.kind = kind
+
+    @property
+    def value(self):
+        return self.func()
+
+    def samples(self):
+        return [("", {}, self.func())]
+
+
+class Histogram:
+
+    kind = "histogram"
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def since(self, start):
+        """Observe the seconds since ``start``, a ``time.perf_counter()``."""
+        self.observe(time.perf_counter() - start)
+
+    def quantile(self, q):
+        """Return the upper bound of the bucket holding quantile ``q``."""
+        with self._lock:
+            counts = list(self.counts)
+            count = self.count
+        if count == 0:
+            return None
+        rank = q * count
+        total = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            total += n
+            if total >= rank:
+                return bound
+        return float("inf")
+
+    def samples(self):
+        with self._lock:
+            counts = list(self.counts)
+            count, total_sum = self.count, self.sum
+        samples = []
+        total = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            total += n
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            samples.append(("_bucket", {"le": le}, total))
+        samples.append(("_sum", {}, total_sum))
+        samples.append(("_count", {}, count))
+        return samples
+
+
+def _escape(value):
+    return (str(value).replace("\\", "\\\\").replace('"', '\\"')
+            .replace("\n", "\\n"))
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{_escape(value)}"'
+                     for key, value in labels.items())
+    return "{" + pairs + "}"
+
+
+class Registry:
+    """Metrics by name and labels.
+
+    Asking again for a metric with the same name and labels returns the
+    existing one, so sessions recreated under the same name keep counting.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name, help, labels, create):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = self._metrics[key] = create()
+                self._help.setdefault(name, help)
+            return metric
+
+    def counter(self, name, help, **labels):
+        return self._get(name, help, labels, Counter)
+
+    def histogram(self, name, help, buckets=BUCKETS, **labels):
+        return self._get(name, help, labels, lambda: Histogram(buckets))
+
+    def callback(self, name, help, func, kind="gauge", **labels):
+        metric = self._get(name, help, labels, lambda: Callback(func, kind))
+        metric.func = func  # follow the latest object under these labels
+        return metric
+
+    def register(self, name, help, metric, **labels):
+        """Add ``metric``, e.g. one kept by another process, replacing any
+        metric of the same name and labels.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._metrics[key] = metric
+            self._help.setdefault(name, help)
+        return metric
+
+    def get(self, name, **labels):
+        return self._metrics.get((name, tuple(sorted(labels.items()))))
+
+    def render(self):
+        with self._lock:
+            metrics = sorted(self._metrics.items(), key=lambda item: item[0])
+        lines = []
+        previous = None
+        for (name, labels), metric in metrics:
+            if name != previous:
+                lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {metric.kind}")
+                previous = name
+            for suffix, extra, value in metric.samples():
+                lines.append(f"{name}{suffix}"
+                             f"{_labels({**dict(labels), **extra})} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def serve(registry=REGISTRY, port=PORT, host="127.0.0.1"):
+    """Serve ``registry`` at ``/metrics`` on a background thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type",
+                             "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True,
+                     name="metrics").start()
+    return server
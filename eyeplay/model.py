@@ -0,0 +1,287 @@
+"""Decision trees exported from the notebooks, evaluated without sklearn.
+
+The movement of an event is decided in three steps, each by a small tree
+over the peak features of :mod:`eyeplay.features`: whether it is a
+``blink``, if not whether it is a look to the ``left`` or the right, and
+whether it is a ``double`` movement. ``analysis/event.ipynb`` fits such
+trees with sklearn, and :func:`export` saves them where the application
+and the daemon load them, along with :func:`rules` for the steps the
+notebook does not fit. Without a saved model, the classifier decides by
+those rules::
+
+    python -m eyeplay.model              # show the saved trees
+    python -m eyeplay.model --rules      # save the rules, to edit
+
+A tree is stored as the flat node arrays of sklearn's ``tree_``, so it is
+evaluated for many events at once by walking every event one level down
+per step. Features counted in samples are given to the trees in seconds,
+so a model does not depend on the sample rate it was fitted at.
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from eyeplay.features import FEATURES
+from eyeplay.pipeline import BLINK_PEAK_GAP_SECONDS, SERIAL_FREQ, EyeMovement
+
+MODEL_PATH = ".config/spiker_playback/model.npz"
+# the features of eyeplay.features, and the order of the high and low peaks
+INPUTS = tuple(name for name, _ in FEATURES) + ("mean_order",)
+SECONDS_INPUTS = ("length", "min_diff_peak", "high_mean", "low_mean",
+                  "last_peak", "mean_order")
+_SECONDS = [INPUTS.index(name) for name in SECONDS_INPUTS]
+STEPS = ("blink", "left", "double")
+LEAF = -1  # children of a leaf, as in sklearn
+
+
+def inputs(event_features, sample_freq):
+    """Return the :data:`INPUTS` of the structured array of
+    :func:`eyeplay.features.extract_many`, as a row per event.
+    """
+    f = event_features
+    columns = [np.asarray(f[name], dtype=np.float64)
+               for name, _ in FEATURES]
+    columns.append(columns[INPUTS.index("high_mean")]
+                   - columns[INPUTS.index("low_mean")])
+    x = np.stack(columns, axis=-1)
+    x[:, _SECONDS] /= sample_freq
+    return x
+
+
+def _row(event_features, sample_freq):
+    # the inputs of one event, without the overhead of arrays
+    row = [float(value) for value in event_features]
+    row.append(event_features.high_mean - event_features.low_mean)
+    for i in _SECONDS:
+        row[i] /= sample_freq
+    return row
+
+
+class Tree:
+    """A binary decision tree as flat arrays, one entry per node.
+
+    An event goes to ``left[node]`` when its input ``feature[node]`` is at
+    most ``threshold[node]``, and to ``right[node]`` otherwise, until a
+    leaf, whose ``value`` is the decision. Leaves have no children.
+    """
+
+    def __init__(self, feature, threshold, left, right, value):
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.intp)
+        self.right = np.asarray(right, dtype=np.intp)
+        self.value = np.asarray(value, dtype=bool)
+        self.depth = self._depth(0)
+        self._nodes = list(zip(self.feature.tolist(),
+                               self.threshold.tolist(), self.left.tolist(),
+                               self.right.tolist(), self.value.tolist()))
+
+    def _depth(self, node):
+        if self.left[node] == LEAF:
+            return 0
+        return 1 + max(self._depth(self.left[node]),
+                       self._depth(self.right[node]))
+
+    @classmethod
+    def leaf(cls, value):
+        return cls([0], [0.0], [LEAF], [LEAF], [value])
+
+    @classmethod
+    def split(cls, feature, threshold, below, above):
+        """Return a tree deciding on ``feature`` at most ``threshold``
+        between the trees ``below`` and ``above``.
+        """
+        offset = 1 + len(below.feature)
+        return cls(
+            np.r_[INPUTS.index(feature), below.feature, above.feature],
+            np.r_[threshold, below.threshold, above.threshold],
+            np.r_[1, _shift(below.left, 1), _shift(above.left, offset)],
+            np.r_[offset, _shift(below.right, 1),
+                  _shift(above.right, offset)],
+            np.r_[False, below.value, above.value])
+
+    def predict(self, x):
+        """Return the decision for every row of inputs ``x``."""
+        node = np.zeros(len(x), dtype=np.intp)
+        rows = np.arange(len(x))
+        for _ in range(self.depth):
+            below = x[rows, self.feature[node]] <= self.threshold[node]
+            child = np.where(below, self.left[node], self.right[node])
+            node = np.where(self.left[node] == LEAF, node, child)
+        return self.value[node]
+
+    def decide(self, row):
+        """Return the decision for a single row of inputs."""
+        feature, threshold, left, right, value = self._nodes[0]
+        while left != LEAF:
+            node = left if row[feature] <= threshold else right
+            feature, threshold, left, right, value = self._nodes[node]
+        return value
+
+    def arrays(self):
+        return {"feature": self.feature, "threshold": self.threshold,
+                "left": self.left, "right": self.right, "value": self.value}
+
+
+def _shift(children, offset):
+    return np.where(children == LEAF, LEAF, children + offset)
+
+
+class Model:
+    """The trees of the three steps, see the module docstring."""
+
+    def __init__(self, blink, left, double):
+        self.trees = {"blink": blink, "left": left, "double": double}
+
+    def classify_many(self, event_features, sample_freq):
+        """Return the movement values of many events, as
+        :func:`eyeplay.pipeline.classify_many` does.
+        """
+        x = inputs(event_features, sample_freq)
+        blink, left, double = (self.trees[step].predict(x) for step in STEPS)
+        movement = np.where(blink, EyeMovement.BLINK.value,
+                            np.where(left, EyeMovement.LEFT.value,
+                                     EyeMovement.RIGHT.value))
+        return np.where(double, np.char.add("double_", movement), movement)
+
+    def classify(self, event_features, sample_freq):
+        """Return the :class:`eyeplay.pipeline.EyeMovement` of the
+        :class:`eyeplay.features.Features` of one event.
+        """
+        row = _row(event_features, sample_freq)
+        if self.trees["blink"].decide(row):
+            movement = EyeMovement.BLINK
+        elif self.trees["left"].decide(row):
+            movement = EyeMovement.LEFT
+        else:
+            movement = EyeMovement.RIGHT
+        if self.trees["double"].decide(row):
+            movement *= 2
+        return movement
+
+    def save(self, path=MODEL_PATH):
+        arrays = {"inputs": np.array(INPUTS)}
+        for step, tree in self.trees.items():
+            for name, array in tree.arrays().items():
+                arrays[f"{step}.{name}"] = array
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as file:
+            np.savez(file, **arrays)
+
+
+def load(path=MODEL_PATH):
+    """Return the :class:`Model` saved at ``path``."""
+    with np.load(path, allow_pickle=False) as arrays:
+        order = [INPUTS.index(name) for name in arrays["inputs"]]
+        trees = {}
+        for step in STEPS:
+            tree = {name: arrays[f"{step}.{name}"]
+                    for name in ("feature", "threshold", "left", "right",
+                                 "value")}
+            # the inputs of an older model may be in another order
+            tree["feature"] = np.take(order, tree["feature"])
+            trees[step] = Tree(**tree)
+    return Model(**trees)
+
+
+def rules(blink_peak_gap_seconds=BLINK_PEAK_GAP_SECONDS):
+    """Return the model of :func:`eyeplay.pipeline.classify_features`.
+
+    An event is a blink without high or low peaks, or with two peaks
+    closer than the gap, a left look when its high peaks come first, and
+    a double with two peaks once smoothed.
+    """
+    # x < gap, as x <= the float below it
+    below_gap = np.nextafter(blink_peak_gap_seconds, -np.inf)
+    no_order = np.nextafter(0.0, -np.inf)
+    blink = Tree.split(
+        "n_high", 0.5, Tree.leaf(True), Tree.split(
+            "n_low", 0.5, Tree.leaf(True), Tree.split(
+                "min_diff_peak", below_gap, Tree.leaf(True),
+                Tree.leaf(False))))
+    left = Tree.split("mean_order", no_order, Tree.leaf(True),
+                      Tree.leaf(False))
+    double = Tree.split("n_smoothed", 1.5, Tree.leaf(False), Tree.leaf(True))
+    return Model(blink, left, double)
+
+
+def from_sklearn(estimator, features, sample_freq=SERIAL_FREQ):
+    """Return the :class:`Tree` of a fitted sklearn
+    ``DecisionTreeClassifier`` with two classes, deciding True for the
+    larger class.
+
+    ``features`` names the :data:`INPUTS` the columns it was fitted on
+    were, and ``sample_freq`` is the sample rate of the features counted
+    in samples.
+    """
+    tree = estimator.tree_
+    leaf = tree.children_left == LEAF
+    feature = np.where(leaf, 0, tree.feature)
+    threshold = tree.threshold.copy()
+    for i, name in enumerate(features):
+        if name in SECONDS_INPUTS:
+            threshold[~leaf & (feature == i)] /= sample_freq
+    classes = estimator.classes_[np.argmax(tree.value[:, 0], axis=1)]
+    return Tree([INPUTS.index(features[i]) for i in feature], threshold,
+                tree.children_left, tree.children_right,
+                classes == estimator.classes_[-1])
+
+
+def export(path=MODEL_PATH, sample_freq=SERIAL_FREQ, **estimators):
+    """Save the sklearn trees given by step, e.g.
+    ``blink=(blink_dt, ["min_diff_peak", "n_peak"])``, as a :class:`Model`,
+    with :func:`rules` for the other steps.
+    """
+    trees = rules().trees
+    for step, (estimator, features) in estimators.items():
+        if step not in trees:
+            raise ValueError(f"Unknown step: {step}, "
+                             f"expected one of {', '.join(STEPS)}")
+        trees[step] = from_sklearn(estimator, features, sample_freq)
+    model = Model(**trees)
+    model.save(path)
+    return model
+
+
+def describe(tree, node=0, depth=0):
+    """Return the lines of ``tree`` from ``node``, indented by depth."""
+    indent = "  " * depth
+    if tree.left[node] == LEAF:
+        return [f"{indent}{bool(tree.value[node])}"]
+    name = INPUTS[tree.feature[node]]
+    threshold = f"{tree.threshold[node]:.6g}"
+    return ([f"{indent}{name} <= {threshold}"]
+            + describe(tree, tree.left[node], depth + 1)
+            + [f"{indent}{name} > {threshold}"]
+            + describe(tree, tree.right[node], depth + 1))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m eyeplay.model",
+        description="Show the classifier exported from the notebooks.")
+    parser.add_argument("path", nargs="?", default=MODEL_PATH,
+                        help=f"of the model (default: {MODEL_PATH})")
+    parser.add_argument("--rules", action="store_true",
+                        help="save the built-in rules to the path first")
+    parser.add_argument("--gap", type=float, default=BLINK_PEAK_GAP_SECONDS,
+                        help="seconds between the peaks of a blink, with "
+                             "--rules")
+    args = parser.parse_args(argv)
+
+    if args.rules:
+        rules(args.gap).save(args.path)
+    try:
+        model = load(args.path)
+    except FileNotFoundError:
+        parser.exit(1, f"No model at {args.path}, the classifier uses the "
+                       "built-in rules\n")
+    for step in STEPS:
+        print(f"{step}:")
+        for line in describe(model.trees[step], depth=1):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
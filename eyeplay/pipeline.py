@@ -0,0 +1,310 @@
+"""Real-time detection and classification of eye movements.
+
+Decoded samples are low-pass filtered and decimated, then passed in chunks
+to a :class:`Classifier`, which detects events by the variance of a sliding
+window and classifies each event once the signal settles again.
+
+The filter passes a few tens of Hz, so the classifier works on every
+``DECIMATION``-th sample. Its windows and gaps are set in seconds and
+converted to samples at its own rate, see :func:`size`.
+
+The thresholds of the detector are collected in :class:`DetectorParams`,
+whose defaults are the values below. ``python -m eyeplay.sweep`` searches
+for better ones over the labelled recordings.
+"""
+import collections
+from enum import Enum
+
+import numpy as np
+
+from eyeplay import features
+from eyeplay.decoder import FRAME_SIZE
+from eyeplay.features import PROMINENCE, SMOOTH_WINDOW_SIZE
+from eyeplay.ringbuffer import RingBuffer
+
+SIGMA = 25
+SAMPLE_FREQ = 20000  # bytes per second read from the serial port
+CHUNK_SECONDS = 0.1
+CHUNK_SIZE = int(SAMPLE_FREQ * CHUNK_SECONDS)
+# samples per second delivered by the serial port, two bytes per sample
+SERIAL_FREQ = CHUNK_SIZE / FRAME_SIZE / CHUNK_SECONDS
+DECIMATION = 10  # decoded samples per sample classified
+DETECTION_FREQ = SERIAL_FREQ / DECIMATION
+
+
+def size(seconds, sample_freq=DETECTION_FREQ):
+    """Return the samples in ``seconds`` of the signal classified."""
+    return int(sample_freq * seconds)
+
+
+# sizes are at DETECTION_FREQ
+WINDOW_SECONDS = 1.6
+WINDOW_SIZE = size(WINDOW_SECONDS)
+EVENT_SECONDS = 20.0  # longest event kept for classification
+EVENT_SIZE = size(EVENT_SECONDS)
+MIN_EVENT_SECONDS = 0.4
+MIN_EVENT_SIZE = size(MIN_EVENT_SECONDS)
+
+SETTLE_SECONDS = 0.8  # quiet time before an event is closed
+SETTLE_SIZE = size(SETTLE_SECONDS)
+
+VARIANCE_THRESHOLD = 250
+OFFSET_THRESHOLD = 150
+# between peaks, shorter gaps are blinks, tuned as 2065 decoded samples
+BLINK_PEAK_GAP_SECONDS = 2065 / SERIAL_FREQ
+BLINK_PEAK_GAP = BLINK_PEAK_GAP_SECONDS * DETECTION_FREQ
+# of the smoothing of the peak features, tuned as 500 decoded samples
+SMOOTH_WINDOW_SECONDS = SMOOTH_WINDOW_SIZE / SERIAL_FREQ
+DOUBLE_DEADLINE_SECONDS = 1.0  # wait for the second of a double movement
+DOUBLE_DEADLINE_SIZE = size(DOUBLE_DEADLINE_SECONDS)
+
+DetectorParams = collections.namedtuple("DetectorParams", [
+    "sigma",  # of the low-pass filter, in Hz
+    "variance_threshold",
+    "offset_threshold",
+    "prominence",
+    "blink_peak_gap_seconds",
+    "min_event_seconds",
+    "smooth_window_seconds",
+])
+DEFAULT_PARAMS = DetectorParams(
+    sigma=SIGMA,
+    variance_threshold=VARIANCE_THRESHOLD,
+    offset_threshold=OFFSET_THRESHOLD,
+    prominence=PROMINENCE,
+    blink_peak_gap_seconds=BLINK_PEAK_GAP_SECONDS,
+    min_event_seconds=MIN_EVENT_SECONDS,
+    smooth_window_seconds=SMOOTH_WINDOW_SECONDS,
+)
+
+
+class EyeMovement(Enum):
+    BLINK = "blink"
+    LEFT = "left"
+    RIGHT = "right"
+    DOUBLE_BLINK = "double_blink"
+    DOUBLE_LEFT = "double_left"
+    DOUBLE_RIGHT = "double_right"
+
+    def __mul__(self, other):
+        if not isinstance(other, int):
+            raise ValueError("Multiplier must be an integer")
+        elif other <= 0:
+            raise ValueError("Multiplier must be a positive integer")
+        if other == 1:
+            return self
+        match self:
+            case EyeMovement.BLINK:
+                return EyeMovement.DOUBLE_BLINK
+            case EyeMovement.LEFT:
+                return EyeMovement.DOUBLE_LEFT
+            case EyeMovement.RIGHT:
+                return EyeMovement.DOUBLE_RIGHT
+            case _:
+                return self
+
+
+def classify_event(event, params=DEFAULT_PARAMS, sample_freq=DETECTION_FREQ,
+                   model=None):
+    return _classify(event, params, sample_freq, model)[0]
+
+
+def _classify(event, params=DEFAULT_PARAMS, sample_freq=DETECTION_FREQ,
+              model=None):
+    # returns the movement and the features it was decided on
+    smooth_size = size(params.smooth_window_seconds, sample_freq)
+    event_features = features.extract(event, params.prominence, smooth_size)
+    if model is not None:
+        return model.classify(event_features, sample_freq), event_features
+    blink_peak_gap = params.blink_peak_gap_seconds * sample_freq
+    return (classify_features(event_features, blink_peak_gap),
+            event_features)
+
+
+def classify_features(event_features, blink_peak_gap=BLINK_PEAK_GAP):
+    """Return the movement of an event from its
+    :class:`eyeplay.features.Features`.
+    """
+    f = event_features
+    if (f.n_high == 0 or f.n_low == 0
+            or f.min_diff_peak < blink_peak_gap):
+        movement = EyeMovement.BLINK
+    elif f.high_mean < f.low_mean:
+        movement = EyeMovement.LEFT
+    else:
+        movement = EyeMovement.RIGHT
+    if f.n_smoothed >= 2:
+        movement *= 2
+    return movement
+
+
+def classify_many(event_features, blink_peak_gap=BLINK_PEAK_GAP):
+    """Vectorized :func:`classify_features` over the structured array of
+    :func:`eyeplay.features.extract_many`, returning movement values.
+    """
+    f = event_features
+    blink = ((f["n_high"] == 0) | (f["n_low"] == 0)
+             | (f["min_diff_peak"] < blink_peak_gap))
+    movement = np.where(blink, EyeMovement.BLINK.value,
+                        np.where(f["high_mean"] < f["low_mean"],
+                                 EyeMovement.LEFT.value,
+                                 EyeMovement.RIGHT.value))
+    return np.where(f["n_smoothed"] >= 2,
+                    np.char.add("double_", movement), movement)
+
+
+def holds_for(keymap):
+    """Return whether a movement has to wait for its double form to be
+    ruled out, given the keymap of the application.
+
+    Double blinks toggle the actions, so blinks always wait.
+    """
+    def holds(movement):
+        double = movement * 2
+        if double == movement:
+            return False
+        return (double == EyeMovement.DOUBLE_BLINK
+                or keymap.get(double.value, "None") != "None")
+    return holds
+
+
+class VarianceTrigger:
+    """Event trigger on the variance of the signal, with hysteresis.
+
+    An event starts when the variance of the last ``window_size`` samples
+    exceeds ``threshold``. It ends as soon as the variance of the last
+    ``settle_size`` samples falls to ``offset``, instead of waiting for a
+    whole window of quiet. The trigger stays inactive until a whole window
+    of the signal has been seen. ``lead`` and ``lag`` are the samples the
+    classifier keeps before the onset and drops after the end.
+    """
+
+    def __init__(self, threshold=VARIANCE_THRESHOLD, offset=OFFSET_THRESHOLD,
+                 window_size=WINDOW_SIZE, settle_size=SETTLE_SIZE):
+        self.threshold = threshold
+        self.offset = offset
+        self.window_size = window_size
+        self.settle_size = settle_size
+        self.samples = RingBuffer(max(window_size, settle_size))
+        self.lead = window_size - window_size // 2
+        self.lag = settle_size // 2
+        self.active = False
+
+    def update(self, chunk):
+        self.samples.write(chunk)
+        if len(self.samples) < self.samples.capacity:
+            return False
+        if self.active:
+            self.active = np.var(
+                self.samples.latest(self.settle_size)) > self.offset
+        else:
+            self.active = np.var(
+                self.samples.latest(self.window_size)) > self.threshold
+        return self.active
+
+
+class Classifier:
+    """Turn chunks of the filtered signal into eye movements.
+
+    :meth:`push` returns the movement once an event has ended, and None
+    otherwise. ``samples`` counts the samples pushed so far, and
+    ``event_end`` is the position in the stream where the last classified
+    event ended, so callers can tell how long a decision took.
+
+    ``trigger`` decides from each chunk whether an event is going on, see
+    :class:`VarianceTrigger`.
+
+    With ``holds``, see :func:`holds_for`, the classifier decides
+    speculatively while the event is still going on. Once a movement is
+    complete, it is returned straight away unless it holds. A movement that
+    holds is returned as soon as its double form is seen, or as a single
+    movement ``deadline`` samples later. ``last_peak`` is the position of
+    the last peak of the movement, where the user perceives it to end, and
+    ``features`` are the :class:`eyeplay.features.Features` of the event
+    it was decided on.
+
+    ``params`` are the :class:`DetectorParams` of the default trigger and
+    of the classification. A ``model``, see :mod:`eyeplay.model`, decides
+    the movement from the features in place of :func:`classify_features`.
+    The chunks are expected to be decimated by ``decimation``, and the
+    positions above count decimated samples.
+    """
+
+    def __init__(self, trigger=None, holds=None, deadline=None,
+                 params=DEFAULT_PARAMS, decimation=DECIMATION, model=None):
+        self.params = params
+        self.model = model
+        self.decimation = decimation
+        self.sample_freq = sample_freq = SERIAL_FREQ / decimation
+        window_size = size(WINDOW_SECONDS, sample_freq)
+        self.min_event_size = size(params.min_event_seconds, sample_freq)
+        self.blink_peak_gap = params.blink_peak_gap_seconds * sample_freq
+        if trigger is None:
+            trigger = VarianceTrigger(params.variance_threshold,
+                                      params.offset_threshold, window_size,
+                                      size(SETTLE_SECONDS, sample_freq))
+        self.trigger = trigger
+        self.holds = holds
+        if deadline is None:
+            deadline = size(DOUBLE_DEADLINE_SECONDS, sample_freq)
+        self.deadline = deadline
+        self.window = RingBuffer(window_size, fill=0.0)
+        self.events = RingBuffer(size(EVENT_SECONDS, sample_freq))
+        self.samples = 0
+        self.event_end = None
+        self.last_peak = None
+        self.features = None
+        self._decided = False
+        self._complete = None
+
+    def push(self, chunk):
+        self.window.write(chunk)
+        self.samples += len(chunk)
+
+        if self.trigger.update(chunk):
+            if len(self.events) == 0:
+                self.events.write(self.window.latest(self.trigger.lead))
+                self._decided = False
+                self._complete = None
+            else:
+                self.events.write(chunk)
+            if self.holds is None or self._decided:
+                return None
+            return self._speculate()
+        elif len(self.events) == 0:
+            return None
+
+        event = self.events.latest()
+        event = event[:len(event) - self.trigger.lag]
+        self.events.clear()
+        if self._decided or len(event) <= self.min_event_size:
+            return None
+        self.event_end = self.samples - len(chunk) - self.trigger.lag
+        movement, f = _classify(event, self.params, self.sample_freq,
+                                self.model)
+        self.last_peak = self.event_end - len(event) + (
+            f.last_peak if f.n_peak else len(event))
+        self.features = f
+        return movement
+
+    def _speculate(self):
+        event = self.events.latest()
+        if len(event) <= self.min_event_size:
+            return None
+        movement, f = _classify(event, self.params, self.sample_freq,
+                                self.model)
+        # a peak further than the gap would not make this a blink, so the
+        # movement is complete as far as the classification can tell
+        if (f.n_peak == 0
+                or len(event) - f.last_peak < self.blink_peak_gap):
+            return None
+        if self._complete is None:
+            self._complete = self.samples
+        if (movement * 2 != movement and self.holds(movement)
+                and self.samples - self._complete < self.deadline):
+            return None
+        self._decided = True
+        self.event_end = self.samples
+        self.last_peak = self.samples - len(event) + f.last_peak
+        self.features = f
+        return movement
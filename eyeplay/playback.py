@@ -0,0 +1,149 @@
+"""Cached playback state for the Spotify backend.
+
+Reading the playback state before every command doubles the latency of an
+action and the API usage. Instead, the state is polled in the background
+and updated optimistically after each command, so every action is a single
+request.
+"""
+import threading
+import time
+
+VOLUME_STEP = 10
+
+
+class SpotifyPlayback:
+    """Playback commands on top of a cached copy of the playback state.
+
+    ``sp`` is a ``spotipy.Spotify`` client, or anything with the same
+    playback methods. The state is refreshed before a command when it is
+    older than ``ttl`` seconds, which only happens when the poller is not
+    running or falls behind.
+    """
+
+    def __init__(self, sp, ttl=5.0):
+        self.sp = sp
+        self.ttl = ttl
+        self.is_playing = None
+        self.volume = None
+        self.updated = float("-inf")
+        self._commanded = float("-inf")
+        self._lock = threading.Lock()
+        self._polling = None
+
+    def refresh(self):
+        started = time.monotonic()
+        playback = self.sp.current_playback()
+        with self._lock:
+            # a command sent during the request makes its result stale
+            if started < self._commanded:
+                return
+            if playback is None:
+                self.is_playing = False
+                self.volume = None
+            else:
+                self.is_playing = playback["is_playing"]
+                device = playback.get("device") or {}
+                self.volume = device.get("volume_percent")
+            self.updated = time.monotonic()
+
+    def _ensure_fresh(self):
+        if time.monotonic() - self.updated > self.ttl:
+            self.refresh()
+
+    def _invalidate(self):
+        with self._lock:
+            self.updated = float("-inf")
+
+    def start_polling(self, interval=None):
+        """Refresh the state every ``interval`` seconds in the background."""
+        if interval is None:
+            interval = self.ttl / 2
+        self._polling = threading.Event()
+
+        def poll(stopped):
+            while not stopped.is_set():
+                try:
+                    self.refresh()
+                except Exception as error:
+                    print(f"{time.time()}: playback refresh failed: "
+                          f"{error!r}")
+                stopped.wait(interval)
+
+        threading.Thread(target=poll, args=(self._polling,),
+                         daemon=True).start()
+        return self
+
+    def stop_polling(self):
+        if self._polling is not None:
+            self._polling.set()
+            self._polling = None
+
+    def playpause(self):
+        self._ensure_fresh()
+        with self._lock:
+            playing = not self.is_playing
+            self.is_playing = playing
+            self._commanded = time.monotonic()
+        self._play(playing)
+
+    def pause(self):
+        """Pause, unless the playback is known to be paused already."""
+        self._set_playing(False)
+
+    def resume(self):
+        """Resume, unless the playback is known to be playing already."""
+        self._set_playing(True)
+
+    def _set_playing(self, playing):
+        self._ensure_fresh()
+        with self._lock:
+            if self.is_playing is playing:
+                return
+            self.is_playing = playing
+            self._commanded = time.monotonic()
+        self._play(playing)
+
+    def _play(self, playing):
+        try:
+            if playing:
+                self.sp.start_playback()
+            else:
+                self.sp.pause_playback()
+        except Exception:
+            self._invalidate()
+            raise
+
+    def next_track(self):
+        self.sp.next_track()
+
+    def previous_track(self):
+        self.sp.previous_track()
+
+    def set_volume(self, volume):
+        # the API rejects a volume out of 0 to 100
+        volume = int(min(max(volume, 0), 100))
+        with self._lock:
+            self.volume = volume
+            self._commanded = time.monotonic()
+        try:
+            self.sp.volume(volume)
+        except Exception:
+            self._invalidate()
+            raise
+
+    def change_volume(self, delta):
+        self._ensure_fresh()
+        with self._lock:
+            volume = self.volume
+        if volume is None:
+            return
+        self.set_volume(volume + delta)
+
+    def volume_up(self, steps=1):
+        self.change_volume(VOLUME_STEP * steps)
+
+    def volume_down(self, steps=1):
+        self.change_volume(-VOLUME_STEP * steps)
+
+    def mute(self):
+        self.set_volume(0)
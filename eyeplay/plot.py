@@ -0,0 +1,73 @@
+"""Live plot of the signal buffer, redrawn with blitting."""
+import numpy as np
+
+
+def minmax_decimate(samples, n_buckets):
+    """Reduce samples to the minimum and maximum of each bucket.
+
+    The result has two points per bucket, so peaks narrower than a pixel
+    are still drawn.
+    """
+    bucket_size = len(samples) // n_buckets
+    if bucket_size < 2:
+        return samples
+    buckets = samples[len(samples) - bucket_size * n_buckets:] \
+        .reshape(n_buckets, bucket_size)
+    decimated = np.empty(2 * n_buckets, dtype=buckets.dtype)
+    decimated[0::2] = buckets.min(axis=1)
+    decimated[1::2] = buckets.max(axis=1)
+    return decimated
+
+
+class LivePlot:
+    """A single line on a fixed set of axes.
+
+    Only the line is redrawn on :meth:`update`, on top of a cached
+    background. The whole figure is redrawn when the line leaves the axes
+    limits or the canvas is resized.
+    """
+
+    def __init__(self, figure, canvas):
+        self.canvas = canvas
+        self.ax = ax = figure.gca()
+        ax.grid(True, axis="y")
+        for spine in ax.spines.values():
+            spine.set_visible(False)
+        ax.get_xaxis().set_ticks([])
+        self.line, = ax.plot([], [], animated=True)
+        self._background = None
+        canvas.mpl_connect("draw_event", self._on_draw)
+
+    def _on_draw(self, _):
+        self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self.ax.draw_artist(self.line)
+
+    def _rescale(self, x, y):
+        rescaled = False
+        if self.ax.get_xlim() != (0, x[-1]):
+            self.ax.set_xlim(0, x[-1])
+            rescaled = True
+        low, high = np.min(y), np.max(y)
+        bottom, top = self.ax.get_ylim()
+        margin = max((high - low) / 10, 1.0)
+        # shrink only to limits a quarter as wide, margins included, so a
+        # flat signal is rescaled once and not on every frame
+        if (low < bottom or high > top
+                or high - low + 2 * margin < (top - bottom) / 4):
+            self.ax.set_ylim(low - margin, high + margin)
+            rescaled = True
+        return rescaled
+
+    def update(self, samples):
+        if len(samples) == 0:
+            return
+        n_buckets = max(1, int(self.ax.bbox.width))
+        y = minmax_decimate(samples, n_buckets)
+        x = np.linspace(0, len(samples), len(y))
+        self.line.set_data(x, y)
+        if self._rescale(x, y) or self._background is None:
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self._background)
+        self.ax.draw_artist(self.line)
+        self.canvas.blit(self.ax.bbox)
@@ -0,0 +1,144 @@
+"""Recording of live sessions in a compact binary format.
+
+A recording is two files with the same stem. ``<stem>.i16`` holds the
+decoded samples as little-endian int16, appended in blocks, so it is
+memory-mapped as is, and a recording cut short is readable up to its last
+block. ``<stem>.jsonl`` is the index, a JSON object per line: the start of
+the recording with its sample rate, the first sample and the time of every
+block, and the movements and actions, by sample and time::
+
+    samples, sample_freq, index = recorder.read("recordings/bed-1-20240501-101500")
+
+The reader thread only queues the samples, and a writer thread writes
+them every ``FLUSH_SECONDS``. :mod:`eyeplay.datasets`, and so
+:mod:`eyeplay.replay`, load the ``.i16`` files like the other recordings.
+"""
+import collections
+import json
+import re
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from eyeplay.pipeline import SERIAL_FREQ
+
+RECORDINGS_DIR = "recordings"
+FLUSH_SECONDS = 1.0
+DTYPE = np.dtype("<i2")
+SAMPLES_SUFFIX = ".i16"
+INDEX_SUFFIX = ".jsonl"
+
+
+class Recorder:
+    """Append the samples and events of a session to the recording at
+    ``path``, without its suffix.
+
+    :meth:`write` and :meth:`event` only queue, and are safe to call from
+    any thread. ``info`` is saved at the start of the index.
+    """
+
+    def __init__(self, path, sample_freq=SERIAL_FREQ,
+                 flush_seconds=FLUSH_SECONDS, **info):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.sample_freq = sample_freq
+        self.flush_seconds = flush_seconds
+        self.written = 0  # samples queued so far
+        self._samples = open(self.path.with_suffix(SAMPLES_SUFFIX), "ab")
+        self._index = open(self.path.with_suffix(INDEX_SUFFIX), "a")
+        self._queue = collections.deque()
+        self._stopped = threading.Event()
+        self.event("start", sample_freq=sample_freq, dtype=DTYPE.str, **info)
+        self._thread = threading.Thread(target=self._write, daemon=True,
+                                        name=f"{self.path.name} recorder")
+        self._thread.start()
+
+    @classmethod
+    def create(cls, directory=RECORDINGS_DIR, name="session", **kwargs):
+        """Start a recording in ``directory``, named after ``name`` and the
+        time.
+        """
+        name = re.sub(r"[^\w-]+", "-", name).strip("-") or "session"
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        return cls(Path(directory) / f"{name}-{stamp}", **kwargs)
+
+    def write(self, samples):
+        """Queue ``samples`` and return the samples written so far, theirs
+        included.
+        """
+        self._queue.append((self.written, time.time(), samples))
+        self.written += len(samples)
+        return self.written
+
+    def event(self, kind, sample=None, **fields):
+        """Add ``kind`` to the index, at ``sample`` or the latest sample."""
+        self._queue.append({
+            "kind": kind,
+            "sample": self.written if sample is None else sample,
+            "time": time.time(),
+            **fields,
+        })
+
+    def _write(self):
+        while not self._stopped.wait(self.flush_seconds):
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        # samples are written in one block, and the index after them
+        blocks, lines = [], []
+        while self._queue:
+            item = self._queue.popleft()
+            if isinstance(item, dict):
+                lines.append(item)
+                continue
+            sample, at, samples = item
+            if not blocks:
+                lines.append({"kind": "block", "sample": sample, "time": at})
+            blocks.append(samples)
+        if blocks:
+            np.concatenate(blocks).astype(DTYPE, copy=False).tofile(
+                self._samples)
+            self._samples.flush()
+        if lines:
+            self._index.write("".join(json.dumps(line) + "\n"
+                                      for line in lines))
+            self._index.flush()
+
+    def close(self):
+        self.event("stop")
+        self._stopped.set()
+        self._thread.join()
+        self._samples.close()
+        self._index.close()
+
+
+def read_index(path):
+    """Return the entries of the index of the recording at ``path``.
+
+    Raises ValueError when there is no index.
+    """
+    try:
+        with open(Path(path).with_suffix(INDEX_SUFFIX)) as file:
+            return [json.loads(line) for line in file if line.strip()]
+    except FileNotFoundError:
+        raise ValueError(f"No index for the recording {path}") from None
+
+
+def read(path):
+    """Return the samples of the recording at ``path``, memory-mapped,
+    with its sample rate and index.
+    """
+    path = Path(path)
+    index = read_index(path)
+    start = index[0]
+    dtype = np.dtype(start.get("dtype", DTYPE))
+    samples_path = path.with_suffix(SAMPLES_SUFFIX)
+    n = samples_path.stat().st_size // dtype.itemsize
+    if n == 0:
+        samples = np.zeros(0, dtype=dtype)
+    else:
+        samples = np.memmap(samples_path, dtype=dtype, mode="r", shape=(n,))
+    return samples, start["sample_freq"], index
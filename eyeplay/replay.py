@@ -0,0 +1,127 @@
+"""Replay recorded sessions through the real-time pipeline.
+
+Recordings are filtered and classified chunk by chunk, exactly like the
+live signal, but as fast as the machine allows::
+
+    python -m eyeplay.replay analysis/data/week9
+"""
+import argparse
+import collections
+import json
+import sys
+import time
+
+import numpy as np
+
+from eyeplay import datasets
+from eyeplay.datasets import find_recordings
+from eyeplay.filters import GaussianFilter
+from eyeplay.pipeline import CHUNK_SECONDS, DECIMATION, SIGMA, Classifier
+from eyeplay.zerocrossing import THRESHOLD, ZeroCrossingTrigger
+
+Detection = collections.namedtuple(
+    "Detection",
+    ["sample", "seconds", "movement", "event_end", "last_peak", "compute",
+     "features"])
+
+
+def iter_chunks(samples, chunk_size):
+    for i in range(0, len(samples), chunk_size):
+        yield samples[i:i + chunk_size]
+
+
+def filter_signal(samples, sample_freq, sigma=SIGMA, decimation=DECIMATION,
+                  chunk_seconds=CHUNK_SECONDS):
+    """Return ``samples`` filtered and decimated chunk by chunk, as
+    :func:`replay` does.
+    """
+    signal_filter = GaussianFilter(sigma, sample_freq, decimation)
+    chunk_size = int(sample_freq * chunk_seconds)
+    chunks = [signal_filter.process(chunk)
+              for chunk in iter_chunks(samples, chunk_size)]
+    return np.concatenate(chunks) if chunks else np.empty(0)
+
+
+def replay(samples, sample_freq, classifier=None,
+           chunk_seconds=CHUNK_SECONDS, filtered=False):
+    """Run the pipeline over ``samples`` and return the detections.
+
+    The samples are filtered with the sigma of the classifier's
+    parameters and decimated to its rate, unless they are ``filtered``
+    already by :func:`filter_signal`. Positions in the detections count
+    the samples given, before decimation. ``compute`` is the wall time
+    spent on the chunk that completed each detection, and ``features``
+    are those of the event as the classifier cut it, at its rate.
+    """
+    if classifier is None:
+        classifier = Classifier()
+    decimation = classifier.decimation
+    signal_filter = GaussianFilter(classifier.params.sigma, sample_freq,
+                                   decimation)
+    chunk_size = int(sample_freq * chunk_seconds)
+    if filtered:
+        chunk_size //= decimation
+    detections = []
+    for chunk in iter_chunks(samples, chunk_size):
+        start = time.perf_counter()
+        if not filtered:
+            chunk = signal_filter.process(chunk)
+        movement = classifier.push(chunk)
+        if movement is not None:
+            detections.append(Detection(
+                classifier.samples * decimation,
+                classifier.samples * decimation / sample_freq,
+                movement,
+                classifier.event_end * decimation,
+                classifier.last_peak * decimation,
+                time.perf_counter() - start,
+                classifier.features,
+            ))
+    return detections
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+",
+                        help="CSV or WAV recordings, recorded sessions, or "
+                             "directories of them")
+    parser.add_argument("--json", action="store_true",
+                        help="print the event log as JSON lines")
+    parser.add_argument("--zero-crossings", type=int, nargs="?",
+                        const=THRESHOLD, metavar="THRESHOLD",
+                        help="detect events by zero crossings instead of "
+                             f"variance (default threshold: {THRESHOLD})")
+    args = parser.parse_args(argv)
+
+    for path in find_recordings(args.paths):
+        try:
+            _, samples, sample_freq, _ = datasets.load(path)
+        except ValueError as error:
+            print(f"{path}: cannot read recording: {error}", file=sys.stderr)
+            continue
+        start = time.perf_counter()
+        trigger = None
+        if args.zero_crossings is not None:
+            trigger = ZeroCrossingTrigger(args.zero_crossings)
+        detections = replay(samples, sample_freq, Classifier(trigger))
+        elapsed = time.perf_counter() - start
+        seconds = len(samples) / sample_freq
+
+        for detection in detections:
+            if args.json:
+                print(json.dumps({
+                    "path": str(path),
+                    "sample": detection.sample,
+                    "seconds": detection.seconds,
+                    "movement": detection.movement.value,
+                }))
+            else:
+                print(f"{path}: {detection.seconds:.3f}: "
+                      f"{detection.movement.value}")
+        print(f"{path}: {len(detections)} events in {seconds:.1f} s, "
+              f"replayed in {elapsed:.2f} s "
+              f"({seconds / elapsed:.0f}x real time)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Preallocated ring buffer for streaming samples."""
+import threading
+
+import numpy as np
+
+
+class RingBuffer:
+    """Fixed-capacity buffer holding the latest samples written to it.
+
+    Every sample is stored twice, one capacity apart, so the latest ``n``
+    samples are always a contiguous slice of the underlying array. Writes
+    cost O(chunk) and :meth:`latest` returns a read-only view without
+    copying. A view stays valid until ``capacity - n`` more samples are
+    written; pass ``copy=True`` to read from another thread than the writer.
+    """
+
+    def __init__(self, capacity, fill=None, dtype=np.float64):
+        self.capacity = capacity
+        self._buffer = np.zeros(2 * capacity, dtype=dtype)
+        self._head = 0
+        self._size = 0
+        self._lock = threading.Lock()
+        if fill is not None:
+            self._buffer[:] = fill
+            self._size = capacity
+
+    def __len__(self):
+        return self._size
+
+    def clear(self):
+        with self._lock:
+            self._head = 0
+            self._size = 0
+
+    def write(self, chunk):
+        chunk = chunk[-self.capacity:]
+        n = len(chunk)
+        capacity = self.capacity
+        with self._lock:
+            head = self._head
+            first = min(n, capacity - head)
+            self._buffer[head:head + first] = chunk[:first]
+            self._buffer[head + capacity:head + capacity + first] = \
+                chunk[:first]
+            rest = n - first
+            if rest:
+                self._buffer[:rest] = chunk[first:]
+                self._buffer[capacity:capacity + rest] = chunk[first:]
+            self._head = (head + n) % capacity
+            self._size = min(self._size + n, capacity)
+
+    def latest(self, n=None, copy=False):
+        with self._lock:
+            if n is None or n > self._size:
+                n = self._size
+            end = self._head + self.capacity
+            view = self._buffer[end - n:end]
+            if copy:
+                return view.copy()
+        view = view.view()
+        view.flags.writeable = False
+        return view
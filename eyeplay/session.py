@@ -0,0 +1,523 @@
+"""Processing of one or more SpikerBox stations in a single process.
+
+A :class:`Session` owns everything a station needs: its serial port, the
+decoder and filter state, the display buffer, the classifier and the
+keymap. A :class:`SessionManager` runs several sessions side by side, so
+one machine can serve several stations. A :class:`ProcessSession` reads
+its port in a child process instead of a thread.
+"""
+import json
+import signal
+import threading
+import time
+
+import serial
+from serial.tools import list_ports
+
+from eyeplay.channel import DROP_OLDEST, Channel
+from eyeplay.decoder import FRAME_SIZE, FrameDecoder
+from eyeplay.filters import GaussianFilter
+from eyeplay.metrics import REGISTRY
+from eyeplay.pipeline import (
+    CHUNK_SECONDS,
+    CHUNK_SIZE,
+    DECIMATION,
+    DEFAULT_PARAMS,
+    DETECTION_FREQ,
+    SERIAL_FREQ,
+    Classifier,
+    holds_for,
+)
+from eyeplay.recorder import Recorder
+from eyeplay.ringbuffer import RingBuffer
+from eyeplay.sharedring import RingReader, SharedRing, fork_context
+
+BAUDRATE = 230400
+BUFFER_SECONDS = 20.0
+BUFFER_SIZE = int(DETECTION_FREQ * BUFFER_SECONDS)
+BACKLOG_SECONDS = 1.0  # signal queued for the classifier before dropping
+BACKLOG_SIZE = int(BACKLOG_SECONDS / CHUNK_SECONDS)
+RECONNECT_SECONDS = 1.0  # how often to look for a lost port
+STAGES = ("read", "decode", "filter", "queue", "classify")
+READER_STAGES = STAGES[:3]
+# samples per chunk handed to the classifier
+CHUNK_SAMPLES = CHUNK_SIZE // FRAME_SIZE // DECIMATION
+READ_TIMEOUT = 0.1  # seconds, how often a reader process checks for commands
+STATIONS_PATH = ".config/spiker_playback/stations.json"
+
+
+def available_ports():
+    return [port.device for port in list_ports.comports()]
+
+
+class Session:
+    """One station: a serial port read on one thread and classified on
+    another.
+
+    ``on_movement`` is called with the session and each classified
+    movement, from the classifying thread. When the classifier falls more
+    than ``backlog`` chunks behind, chunks are dropped by the ``overload``
+    policy, see :class:`eyeplay.channel.Channel`.
+
+    ``timings`` holds the seconds spent per chunk in each of the
+    ``STAGES``, and the counters are exported to ``registry`` labelled
+    with the session name. ``params`` are the
+    :class:`eyeplay.pipeline.DetectorParams` of the filter and classifier,
+    and ``model`` the :class:`eyeplay.model.Model` of the classifier, if
+    any. With ``record``, the decoded samples, the movements and the
+    actions are recorded in that directory, see
+    :class:`eyeplay.recorder.Recorder`.
+    """
+
+    def __init__(self, port=None, keymap=None, on_movement=None, name=None,
+                 baudrate=BAUDRATE, overload=DROP_OLDEST,
+                 backlog=BACKLOG_SIZE, registry=REGISTRY,
+                 params=DEFAULT_PARAMS, model=None, record=None):
+        self.name = name or port or "session"
+        self.port = None
+        self.serial = None
+        self.baudrate = baudrate
+        self.keymap = keymap if keymap is not None else {}
+        self.on_movement = on_movement
+        # single movements whose double form does nothing act without waiting
+        self.classifier = Classifier(holds=holds_for(self.keymap),
+                                     params=params, model=model)
+        self._make_buffers(params, overload, backlog)
+        self.recorder = None
+        if record is not None:
+            self.recorder = Recorder.create(record, self.name,
+                                            sample_freq=SERIAL_FREQ,
+                                            params=params._asdict())
+        self.bytes_read = 0
+        self.samples = 0
+        self.classified = 0
+        self.movements = 0
+        self.read_errors = 0
+        self.started = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._connected = threading.Event()
+        self._threads = []
+        self.timings = {}
+        self._instrument(registry)
+        if port is not None:
+            self.open(port)
+
+    def _make_buffers(self, params, overload, backlog):
+        # the stages between the port and the classifier
+        self.decoder = FrameDecoder()
+        self.filter = GaussianFilter(params.sigma, SERIAL_FREQ, DECIMATION)
+        self.display = RingBuffer(BUFFER_SIZE, fill=500.0)
+        self.chunks = Channel(backlog, overload)
+
+    def _instrument(self, registry):
+        for stage in STAGES:
+            self.timings[stage] = registry.histogram(
+                "eyeplay_stage_seconds",
+                "Seconds spent on a chunk by each stage of the pipeline",
+                session=self.name, stage=stage)
+        for name, help, func, kind in (
+                ("eyeplay_samples_read_total", "Samples decoded and filtered",
+                 lambda: self.samples, "counter"),
+                ("eyeplay_samples_classified_total",
+                 "Samples pushed through the classifier",
+                 lambda: self.classified, "counter"),
+                ("eyeplay_dropped_bytes_total",
+                 "Serial bytes that were not part of a frame",
+                 lambda: self.decoder.dropped, "counter"),
+                ("eyeplay_dropped_chunks_total",
+                 "Chunks dropped because the classifier fell behind",
+                 lambda: self.chunks.dropped, "counter"),
+                ("eyeplay_movements_total", "Eye movements classified",
+                 lambda: self.movements, "counter"),
+                ("eyeplay_read_errors_total", "Failed serial reads",
+                 lambda: self.read_errors, "counter"),
+                ("eyeplay_backlog_chunks", "Chunks waiting for the classifier",
+                 lambda: len(self.chunks), "gauge"),
+                ("eyeplay_connected", "Whether the serial port is open",
+                 lambda: int(self.serial is not None), "gauge")):
+            registry.callback(name, help, func, kind, session=self.name)
+
+    def open(self, port):
+        """Switch to ``port`` and start over with fresh filter state."""
+        with self._lock:
+            previous = self.serial
+            self.port = port
+            self.serial = serial.Serial(port, self.baudrate)
+            self.decoder.reset()
+            self.filter.reset()
+            self._connected.set()
+        if previous is not None:
+            # the reader closes the old port once its read returns
+            previous.cancel_read()
+
+    def _disconnect(self, failed):
+        failed.close()
+        with self._lock:
+            if self.serial is not failed:
+                return  # the port was switched while reading
+            self.serial = None
+            self._connected.clear()
+
+    def _wait_for_port(self):
+        # block until a port is opened, trying the lost one now and then
+        if self._connected.wait(RECONNECT_SECONDS) or self.port is None:
+            return
+        if self.port in available_ports() and not self._stopped.is_set():
+            try:
+                self.open(self.port)
+            except serial.SerialException:
+                pass
+
+    def read(self):
+        while not self._stopped.is_set():
+            port = self.serial
+            if port is None:
+                self._wait_for_port()
+                continue
+            start = time.perf_counter()
+            try:
+                raw = port.read(CHUNK_SIZE)
+            except serial.SerialException:
+                self.read_errors += 1
+                self._disconnect(port)
+                continue
+            if self._stopped.is_set():
+                break
+            if port is not self.serial:
+                port.close()
+                continue
+            self.bytes_read += len(raw)
+            read = time.perf_counter()
+            self.timings["read"].observe(read - start)
+            chunk = self.decoder.decode(raw)
+            if len(chunk) == 0:
+                continue
+            decoded = time.perf_counter()
+            self.timings["decode"].observe(decoded - read)
+            self.samples += len(chunk)
+            written = None
+            if self.recorder is not None:
+                written = self.recorder.write(chunk)
+            chunk = self.filter.process(chunk)
+            filtered = time.perf_counter()
+            self.timings["filter"].observe(filtered - decoded)
+            self.chunks.put((filtered, chunk, written))
+            self.display.write(chunk)
+
+    def classify(self):
+        while (item := self.chunks.get()) is not None:
+            queued, chunk, written = item
+            start = time.perf_counter()
+            self.timings["queue"].observe(start - queued)
+            movement = self.classifier.push(chunk)
+            self.timings["classify"].since(start)
+            self.classified += len(chunk) * DECIMATION
+            if movement is None:
+                continue
+            self.movements += 1
+            if self.recorder is not None:
+                self._record(movement, written)
+            if self.on_movement is not None:
+                self.on_movement(self, movement)
+
+    def _record(self, movement, written):
+        # the positions of the classifier count the decimated samples it
+        # was given, so they are taken back from the end of the last chunk
+        # in the recording, which also skips the chunks dropped before it,
+        # and from the output of the filter to its input
+        classifier = self.classifier
+        end = written - self.filter.delay
+
+        def position(sample):
+            return end - (classifier.samples - sample) * classifier.decimation
+
+        self.recorder.event("movement", position(classifier.samples),
+                            movement=movement.value,
+                            event_end=position(classifier.event_end),
+                            last_peak=position(classifier.last_peak))
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._threads = [
+            threading.Thread(target=self.read, daemon=True,
+                             name=f"{self.name} reader"),
+            threading.Thread(target=self.classify, daemon=True,
+                             name=f"{self.name} classifier"),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        self._connected.set()
+        port = self.serial
+        if port is not None:
+            port.cancel_read()
+        self.chunks.close()
+        for thread in self._threads:
+            thread.join(timeout)
+        if port is not None:
+            port.close()
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def _reader_stats(self):
+        # the counters of the stages in _make_buffers
+        return {
+            "connected": self.serial is not None,
+            "bytes_read": self.bytes_read,
+            "samples": self.samples,
+            "dropped_bytes": self.decoder.dropped,
+            "read_errors": self.read_errors,
+        }
+
+    def stats(self):
+        elapsed = (time.perf_counter() - self.started
+                   if self.started is not None else 0.0)
+        reader = self._reader_stats()
+        return {
+            "name": self.name,
+            "port": self.port,
+            "connected": reader["connected"],
+            "seconds": elapsed,
+            "bytes_read": reader["bytes_read"],
+            "samples": reader["samples"],
+            "samples_per_second": (reader["samples"] / elapsed if elapsed
+                                   else 0.0),
+            "classified": self.classified,
+            "dropped_bytes": reader["dropped_bytes"],
+            "backlog": len(self.chunks),
+            "dropped_chunks": self.chunks.dropped,
+            "movements": self.movements,
+            "read_errors": reader["read_errors"],
+        }
+
+
+class ProcessSession(Session):
+    """A :class:`Session` whose port is read, decoded and filtered in a
+    child process, so that a GUI or classifier holding the GIL never delays
+    the serial reads.
+
+    The child writes the filtered samples to a
+    :class:`eyeplay.sharedring.SharedRing`, which is also the ``display``,
+    and the classifier thread reads them in order through a
+    :class:`eyeplay.sharedring.RingReader`. The ring holds the counters
+    and the timings of the reading stages too. The child is forked as the
+    session is created, so create sessions before starting other threads,
+    and it needs the fork start method, which Windows lacks. The decoded
+    samples never reach this process, so it cannot ``record``.
+    """
+
+    def __init__(self, port=None, keymap=None, on_movement=None, name=None,
+                 baudrate=BAUDRATE, overload=DROP_OLDEST,
+                 backlog=BACKLOG_SIZE, registry=REGISTRY,
+                 params=DEFAULT_PARAMS, model=None, record=None):
+        if record is not None:
+            raise ValueError("Recording needs the samples read by a thread")
+        context = self._context = fork_context()
+        super().__init__(None, keymap, on_movement, name or port, baudrate,
+                         overload, backlog, registry, params, model)
+        self.port = port
+        self._control, control = context.Pipe()
+        self._exited = context.Event()
+        self._process = context.Process(
+            target=_read_process, name=f"{self.name} reader", daemon=True,
+            args=(self.ring, port, baudrate, params.sigma, control,
+                  self._exited))
+        self._process.start()
+
+    def _make_buffers(self, params, overload, backlog):
+        # the decoder and the filter are in the reader process
+        self.ring = SharedRing(
+            BUFFER_SIZE,
+            counters=("bytes_read", "samples", "dropped_bytes",
+                      "read_errors", "connected"),
+            histograms=READER_STAGES, fill=500.0, context=self._context)
+        self._unlinked = False
+        self.display = self.ring
+        self.chunks = RingReader(self.ring, backlog * CHUNK_SAMPLES, overload,
+                                 CHUNK_SAMPLES)
+
+    def _instrument(self, registry):
+        ring = self.ring
+        for stage in STAGES:
+            name = "eyeplay_stage_seconds"
+            help = "Seconds spent on a chunk by each stage of the pipeline"
+            if stage in READER_STAGES:
+                self.timings[stage] = registry.register(
+                    name, help, ring.histogram(stage), session=self.name,
+                    stage=stage)
+            else:
+                self.timings[stage] = registry.histogram(
+                    name, help, session=self.name, stage=stage)
+        for name, help, func, kind in (
+                ("eyeplay_samples_read_total", "Samples decoded and filtered",
+                 lambda: ring.counter("samples"), "counter"),
+                ("eyeplay_samples_classified_total",
+                 "Samples pushed through the classifier",
+                 lambda: self.classified, "counter"),
+                ("eyeplay_dropped_bytes_total",
+                 "Serial bytes that were not part of a frame",
+                 lambda: ring.counter("dropped_bytes"), "counter"),
+                ("eyeplay_dropped_chunks_total",
+                 "Chunks dropped because the classifier fell behind",
+                 lambda: self.chunks.dropped, "counter"),
+                ("eyeplay_movements_total", "Eye movements classified",
+                 lambda: self.movements, "counter"),
+                ("eyeplay_read_errors_total", "Failed serial reads",
+                 lambda: ring.counter("read_errors"), "counter"),
+                ("eyeplay_backlog_chunks", "Chunks waiting for the classifier",
+                 lambda: len(self.chunks), "gauge"),
+                ("eyeplay_connected", "Whether the serial port is open",
+                 lambda: ring.counter("connected"), "gauge")):
+            registry.callback(name, help, func, kind, session=self.name)
+
+    def open(self, port):
+        """Switch to ``port``, in the reader process."""
+        with self._lock:
+            self.port = port
+            self._control.send(port)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._threads = [threading.Thread(target=self.classify, daemon=True,
+                                          name=f"{self.name} classifier")]
+        self._threads[0].start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        self._exited.set()
+        self.chunks.close()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._process.join(timeout)
+        # views of the ring may still be in use, so it is only unlinked
+        if not self._unlinked:
+            self.ring.unlink()
+            self._unlinked = True
+
+    def _reader_stats(self):
+        ring = self.ring
+        return {
+            "connected": bool(ring.counter("connected")),
+            "bytes_read": ring.counter("bytes_read"),
+            "samples": ring.counter("samples"),
+            "dropped_bytes": ring.counter("dropped_bytes"),
+            "read_errors": ring.counter("read_errors"),
+        }
+
+
+def _read_process(ring, port, baudrate, sigma, control, exited):
+    # the loop of Session.read, in the child of a ProcessSession
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    decoder = FrameDecoder()
+    signal_filter = GaussianFilter(sigma, SERIAL_FREQ, DECIMATION)
+    timings = {stage: ring.histogram(stage) for stage in READER_STAGES}
+
+    def connect(port):
+        try:
+            device = serial.Serial(port, baudrate, timeout=READ_TIMEOUT)
+        except serial.SerialException:
+            ring.add("read_errors")
+            return None
+        decoder.reset()
+        signal_filter.reset()
+        ring.set("connected", 1)
+        return device
+
+    def disconnect(device):
+        device.close()
+        ring.set("connected", 0)
+
+    device = None if port is None else connect(port)
+    while not exited.is_set():
+        if control.poll(0 if device is not None else RECONNECT_SECONDS):
+            port = control.recv()
+            if device is not None:
+                disconnect(device)
+            device = connect(port)
+            continue
+        if device is None:
+            if port is not None and port in available_ports():
+                device = connect(port)
+            continue
+        start = time.perf_counter()
+        try:
+            raw = device.read(CHUNK_SIZE)
+        except serial.SerialException:
+            ring.add("read_errors")
+            disconnect(device)
+            device = None
+            continue
+        ring.add("bytes_read", len(raw))
+        read = time.perf_counter()
+        timings["read"].observe(read - start)
+        chunk = decoder.decode(raw)
+        ring.set("dropped_bytes", decoder.dropped)
+        if len(chunk) == 0:
+            continue
+        decoded = time.perf_counter()
+        timings["decode"].observe(decoded - read)
+        ring.add("samples", len(chunk))
+        chunk = signal_filter.process(chunk)
+        timings["filter"].since(decoded)
+        ring.write(chunk)
+    if device is not None:
+        disconnect(device)
+
+
+class SessionManager:
+    """Several sessions run in one process, each on its own threads."""
+
+    def __init__(self, sessions=()):
+        self.sessions = {}
+        for session in sessions:
+            self.add(session)
+
+    @classmethod
+    def from_config(cls, path=STATIONS_PATH, on_movement=None,
+                    params=DEFAULT_PARAMS, model=None, record=None,
+                    factory=Session):
+        """Create a session per station listed in a JSON file, e.g.
+        ``[{"name": "bed 1", "port": "/dev/ttyUSB0", "keymap": {...}}]``,
+        optionally with an ``overload`` policy per station.
+        """
+        with open(path) as file:
+            stations = json.load(file)
+        return cls(factory(station["port"],
+                           keymap=station.get("keymap"),
+                           on_movement=on_movement,
+                           name=station.get("name"),
+                           overload=station.get("overload", DROP_OLDEST),
+                           params=params, model=model, record=record)
+                   for station in stations)
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def __iter__(self):
+        return iter(self.sessions.values())
+
+    def __getitem__(self, name):
+        return self.sessions[name]
+
+    def add(self, session):
+        if session.name in self.sessions:
+            raise ValueError(f"Duplicate session name: {session.name}")
+        self.sessions[session.name] = session
+        return session
+
+    def start(self):
+        for session in self:
+            session.start()
+        return self
+
+    def stop(self, timeout=None):
+        for session in self:
+            session.stop(timeout)
+
+    def stats(self):
+        return [session.stats() for session in self]
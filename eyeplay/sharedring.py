@@ -0,0 +1,290 @@
+"""Ring of samples in shared memory, written by one process and read by
+others without copying.
+
+:class:`eyeplay.session.ProcessSession` reads the serial port in a child
+process, which writes the filtered samples here. The classifier thread
+reads them in order through a :class:`RingReader`, and the plot maps the
+latest samples directly.
+"""
+import bisect
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from eyeplay.channel import DROP_OLDEST, LATEST, POLICIES
+from eyeplay.metrics import BUCKETS, Histogram
+
+
+def fork_context():
+    """Return the multiprocessing context the ring is shared through.
+
+    Raises RuntimeError on platforms without fork, such as Windows.
+    """
+    if "fork" not in multiprocessing.get_all_start_methods():
+        raise RuntimeError("Reading in a child process needs the fork "
+                           "start method, which this platform lacks")
+    return multiprocessing.get_context("fork")
+
+
+class SharedRing:
+    """Fixed-capacity ring of float64 samples in shared memory.
+
+    As in :class:`eyeplay.ringbuffer.RingBuffer`, every sample is stored
+    twice, so the latest samples are always a contiguous view. There is a
+    single writer. ``written`` counts the samples written so far and moves
+    after the samples are in place, and ``writing`` moves before, so a
+    reader can tell whether the samples it read were overwritten meanwhile,
+    as with a seqlock.
+
+    ``counters`` name integer slots and ``histograms`` name timings, both
+    updated by the writer, see :meth:`counter` and :meth:`histogram`. The
+    ring is shared with child processes by forking, and ``ready`` is
+    notified after every write.
+    """
+
+    def __init__(self, capacity, counters=(), histograms=(), fill=None,
+                 context=None):
+        context = context or fork_context()
+        self.capacity = capacity
+        self._slots = {name: i for i, name in
+                       enumerate(("written", "writing", "last_size",
+                                  *counters))}
+        self._histograms = {name: i for i, name in enumerate(histograms)}
+        n_buckets = len(BUCKETS) + 1
+        sizes = (8 * len(self._slots), 8,
+                 8 * len(histograms) * n_buckets, 8 * len(histograms),
+                 8 * 2 * capacity)
+        self._shm = _Segment(create=True, size=sum(sizes))
+        offsets = np.cumsum((0,) + sizes)
+        buf = self._shm.buf
+        self._ints = np.ndarray(len(self._slots), np.int64, buf, offsets[0])
+        self._time = np.ndarray(1, np.float64, buf, offsets[1])
+        self._counts = np.ndarray((len(histograms), n_buckets), np.int64,
+                                  buf, offsets[2])
+        self._sums = np.ndarray(len(histograms), np.float64, buf, offsets[3])
+        self._buffer = np.ndarray(2 * capacity, np.float64, buf, offsets[4])
+        self._ints[:] = 0
+        self._time[:] = 0.0
+        self._counts[:] = 0
+        self._sums[:] = 0.0
+        self._buffer[:] = 0.0 if fill is None else fill
+        if fill is not None:
+            self._ints[self._slots["written"]] = capacity
+            self._ints[self._slots["writing"]] = capacity
+        self.ready = context.Condition()
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def written(self):
+        return int(self._ints[0])
+
+    @property
+    def written_at(self):
+        """``time.perf_counter()`` of the last write, comparable across
+        processes on Linux.
+        """
+        return float(self._time[0])
+
+    @property
+    def last_size(self):
+        return int(self._ints[2])
+
+    def __len__(self):
+        return min(self.written, self.capacity)
+
+    def counter(self, name):
+        return int(self._ints[self._slots[name]])
+
+    def add(self, name, amount=1):
+        self._ints[self._slots[name]] += amount
+
+    def set(self, name, value):
+        self._ints[self._slots[name]] = value
+
+    def histogram(self, name):
+        i = self._histograms[name]
+        return SharedHistogram(self._counts[i], self._sums[i:i + 1])
+
+    def write(self, chunk):
+        chunk = np.asarray(chunk, dtype=np.float64)[-self.capacity:]
+        n = len(chunk)
+        if n == 0:
+            return
+        capacity = self.capacity
+        written = self.written
+        self._ints[1] = written + n
+        head = written % capacity
+        first = min(n, capacity - head)
+        self._buffer[head:head + first] = chunk[:first]
+        self._buffer[head + capacity:head + capacity + first] = chunk[:first]
+        rest = n - first
+        if rest:
+            self._buffer[:rest] = chunk[first:]
+            self._buffer[capacity:capacity + rest] = chunk[first:]
+        self._ints[2] = n
+        self._time[0] = time.perf_counter()
+        self._ints[0] = written + n
+        with self.ready:
+            self.ready.notify_all()
+
+    def _view(self, start, end):
+        # samples start to end, counted from the first written
+        head = end % self.capacity + self.capacity
+        return self._buffer[head - (end - start):head]
+
+    def read(self, start, end=None):
+        """Return a copy of the samples ``start`` to ``end``, counted from
+        the first ever written, or None if they were overwritten.
+        """
+        if end is None:
+            end = self.written
+        if end - start > self.capacity:
+            return None
+        samples = self._view(start, end).copy()
+        if self._ints[1] - start > self.capacity:
+            return None
+        return samples
+
+    def latest(self, n=None, copy=False):
+        """Return the latest ``n`` samples, a read-only view unless
+        ``copy``, with the same caveats as
+        :meth:`eyeplay.ringbuffer.RingBuffer.latest`.
+        """
+        while True:
+            end = self.written
+            size = min(end, self.capacity)
+            if n is not None and n < size:
+                size = n
+            if not copy:
+                view = self._view(end - size, end).view()
+                view.flags.writeable = False
+                return view
+            samples = self.read(end - size, end)
+            if samples is not None:
+                return samples
+
+    def unlink(self):
+        """Free the memory once every process has let go of its views."""
+        self._shm.unlink()
+
+
+class _Segment(shared_memory.SharedMemory):
+    # numpy views do not stop the segment from being closed under them, so
+    # it is unmapped only when the last view is freed, never explicitly
+
+    def __del__(self):
+        pass
+
+
+class SharedHistogram(Histogram):
+    """A :class:`eyeplay.metrics.Histogram` over counts in shared memory,
+    observed by a single process and read by any.
+    """
+
+    def __init__(self, counts, sums, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = counts
+        self._sums = sums
+        self._lock = _NoLock()
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    @property
+    def sum(self):
+        return float(self._sums[0])
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[0] += value
+
+
+class _NoLock:
+    # reads of the counts race with the writer by at most one observation
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class RingReader:
+    """Read the samples of a :class:`SharedRing` in order, in place of an
+    :class:`eyeplay.channel.Channel` of chunks.
+
+    :meth:`get` returns the samples written since the last call. A reader
+    more than ``maxsize`` samples behind skips to the latest ``maxsize``,
+    or with ``latest`` to the last chunk written. ``dropped`` counts the
+    samples skipped, and ``chunk_size`` converts samples to chunks in
+    :meth:`__len__` and :meth:`stats`.
+    """
+
+    def __init__(self, ring, maxsize, policy=DROP_OLDEST, chunk_size=1):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overload policy: {policy}")
+        self.ring = ring
+        self.maxsize = maxsize
+        self.policy = policy
+        self.chunk_size = chunk_size
+        self.position = ring.written
+        self.put_count = 0
+        self.dropped_samples = 0
+        self._closed = False
+
+    @property
+    def dropped(self):
+        return self.dropped_samples // self.chunk_size
+
+    def __len__(self):
+        return (self.ring.written - self.position) // self.chunk_size
+
+    def get(self, timeout=None):
+        """Return the time of the last write, the samples since the last
+        call and the position of their end in the ring, or None once
+        closed, or after ``timeout`` seconds.
+        """
+        ring = self.ring
+        with ring.ready:
+            ring.ready.wait_for(
+                lambda: ring.written > self.position or self._closed,
+                timeout)
+        if self._closed:
+            return None
+        while True:
+            end = ring.written
+            if end == self.position:
+                return None
+            written_at = ring.written_at
+            start = self.position
+            keep = (ring.last_size if self.policy == LATEST
+                    else self.maxsize)
+            if end - start > keep:
+                start = end - keep
+            samples = ring.read(start, end)
+            if samples is None:
+                continue  # overwritten while reading, skip ahead
+            self.dropped_samples += start - self.position
+            self.position = end
+            self.put_count += 1
+            return written_at, samples, end
+
+    def close(self):
+        self._closed = True
+        with self.ring.ready:
+            self.ring.ready.notify_all()
+
+    def stats(self):
+        return {
+            "policy": self.policy,
+            "queued": len(self),
+            "maxsize": self.maxsize // self.chunk_size,
+            "put": self.put_count,
+            "dropped": self.dropped,
+        }
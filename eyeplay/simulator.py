@@ -0,0 +1,419 @@
+"""A simulated SpikerBox on a pseudo-terminal, to test the serial path
+without the device.
+
+A recording is encoded in the two-byte frames of the device and written to
+a pty at the rate of the device, ``--rate`` times faster, or as fast as the
+reader takes it. Eye movements are injected at known times, so the latency
+from the end of a movement to its action is measured end to end, through
+the port, a :class:`eyeplay.session.Session` and an
+:class:`eyeplay.dispatcher.ActionDispatcher`::
+
+    python -m eyeplay.simulator --rate 10
+    python -m eyeplay.simulator --inject left@5 \\
+        analysis/data/week9/non_event/noneventdata2204.wav
+    python -m eyeplay.simulator --find-max-rate
+
+With ``--serve``, the signal is streamed in a loop until interrupted, and
+the port can be given to the daemon, ``python -m eyeplay.daemon --port``.
+"""
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+import tty
+from functools import partial
+
+import numpy as np
+
+from eyeplay import datasets
+from eyeplay.channel import DROP_OLDEST
+from eyeplay.config import DETECTOR_PATH, read_detector
+from eyeplay.decoder import FRAME_SIZE, encode_frames
+from eyeplay.dispatcher import ActionDispatcher
+from eyeplay.evaluate import LAP_TOLERANCE, summary
+from eyeplay.metrics import Registry
+from eyeplay.pipeline import DEFAULT_PARAMS, SERIAL_FREQ, EyeMovement
+from eyeplay.session import ProcessSession, Session
+
+SLICE_SECONDS = 0.01  # of signal written to the terminal at once
+SECONDS = 60.0
+EVENT_EVERY = 4.0  # seconds between injected movements
+# shape of the injected movements, in device units and seconds
+BASELINE = 500
+NOISE = 15
+AMPLITUDE = 400
+WIDTH = 0.05
+SWING_GAP = 0.25  # between the two swings of a look
+REPEAT_GAP = 0.9  # between the two movements of a double
+RATES = (1, 2, 4, 8, 16, 32, 64, 128)
+DRAIN_SECONDS = 1.0  # waited after the stream for the last actions
+
+Injection = collections.namedtuple("Injection", ["seconds", "movement"])
+# sample positions of an injected movement, from its start to its end
+Event = collections.namedtuple("Event", ["start", "end", "movement"])
+
+
+def device_samples(samples):
+    """Convert the samples of a WAV recording to the 14-bit unsigned
+    samples sent by the device.
+    """
+    samples = np.asarray(samples)
+    if samples.dtype.kind == "i" and samples.dtype.itemsize == 2:
+        samples = samples.astype(np.int32) // 4 + 0x2000
+    return np.clip(samples, 0, 0x3FFF).astype(np.int16)
+
+
+def quiet_samples(seconds=SECONDS, sample_freq=SERIAL_FREQ, seed=0):
+    """Return a signal without eye movements, to inject movements into."""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sample_freq)
+    t = np.arange(n) / sample_freq
+    samples = (BASELINE + NOISE * rng.standard_normal(n)
+               + 5 * np.sin(2 * np.pi * 0.1 * t))
+    return device_samples(samples)
+
+
+def movement_wave(movement, sample_freq=SERIAL_FREQ):
+    """Return the signal added by ``movement``.
+
+    A blink is a single bump, a look a swing one way then back, to the
+    left when it goes up first, and doubles repeat the movement.
+    """
+    single = movement.value.removeprefix("double_")
+    swings = {"blink": (1,), "left": (1, -1), "right": (-1, 1)}[single]
+    repeats = 1 if single == movement.value else 2
+    centres = [2 * WIDTH + r * REPEAT_GAP + s * SWING_GAP
+               for r in range(repeats) for s in range(len(swings))]
+    end = centres[-1] + 2 * WIDTH
+    t = np.arange(int(end * sample_freq)) / sample_freq
+    wave = np.zeros(len(t))
+    for centre, sign in zip(centres, swings * repeats):
+        wave += sign * AMPLITUDE * np.exp(-((t - centre) / WIDTH) ** 2)
+    return wave
+
+
+def inject(samples, injections, sample_freq=SERIAL_FREQ):
+    """Add the movements of ``injections`` to a copy of ``samples``.
+
+    Returns the samples and the :class:`Event` of every injection.
+    """
+    samples = np.asarray(samples, dtype=np.float64).copy()
+    events = []
+    for seconds, movement in sorted(injections, key=lambda i: i.seconds):
+        wave = movement_wave(movement, sample_freq)
+        start = int(seconds * sample_freq)
+        if start + len(wave) > len(samples):
+            raise ValueError(f"{movement.value} at {seconds} s does not fit "
+                             "in the signal")
+        samples[start:start + len(wave)] += wave
+        events.append(Event(start, start + len(wave), movement))
+    return device_samples(samples), events
+
+
+def every(seconds, period=EVENT_EVERY, movements=tuple(EyeMovement)):
+    """Return injections of ``movements`` in turn, one every ``period``
+    seconds, leaving time at the end for the last to be classified.
+    """
+    times = np.arange(period, seconds - period, period)
+    return [Injection(float(t), movements[i % len(movements)])
+            for i, t in enumerate(times)]
+
+
+class Simulator:
+    """A SpikerBox streaming ``samples`` to the pseudo-terminal at
+    :attr:`port`.
+
+    The samples are sent at ``rate`` times the rate of the device, or as
+    fast as the reader takes them when ``rate`` is None. At a fixed rate
+    the writes never block, as the device does not wait for the host, and
+    the bytes that do not fit in the terminal buffer are counted in
+    :attr:`lost`. The stream is written by a child process, so it keeps
+    time whatever the reader does, and the time every slice was written is
+    kept for :meth:`written_at`.
+    """
+
+    def __init__(self, samples, sample_freq=SERIAL_FREQ, rate=1.0,
+                 loop=False, context=None):
+        context = context or multiprocessing.get_context("fork")
+        self.data = encode_frames(samples)
+        self.sample_freq = sample_freq
+        self.rate = rate
+        self.loop = loop
+        self.slice_size = max(1, int(SLICE_SECONDS * sample_freq))
+        n_slices = -(-len(samples) // self.slice_size)
+        self._times = context.RawArray("d", n_slices)
+        self._lost = context.RawValue("q", 0)
+        self._stopped = context.Event()
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._master)
+        tty.setraw(self._slave)
+        self._process = context.Process(target=self._feed, daemon=True)
+
+    @property
+    def port(self):
+        return os.ttyname(self._slave)
+
+    @property
+    def lost(self):
+        """Bytes that did not fit in the terminal buffer."""
+        return self._lost.value
+
+    def start(self):
+        """Start streaming, after the port has been opened, since opening
+        it flushes the terminal buffer.
+        """
+        self._process.start()
+        return self
+
+    def join(self, timeout=None):
+        self._process.join(timeout)
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        self._process.join(timeout)
+        os.close(self._master)
+        os.close(self._slave)
+
+    def _feed(self):
+        # stopped by the parent, see stop
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        os.set_blocking(self._master, self.rate is None)
+        size = self.slice_size * FRAME_SIZE
+        period = None if self.rate is None else SLICE_SECONDS / self.rate
+        data = memoryview(self.data)
+        n_slices = len(self._times)
+        start = time.perf_counter()
+        i = 0
+        while not self._stopped.is_set():
+            if i == n_slices and not self.loop:
+                break
+            if period is not None:
+                time.sleep(max(0.0, start + i * period - time.perf_counter()))
+            block = data[i % n_slices * size:][:size]
+            try:
+                written = os.write(self._master, block)
+            except BlockingIOError:
+                written = 0
+            self._times[i % n_slices] = time.perf_counter()
+            self._lost.value += len(block) - written
+            i += 1
+
+    def written_at(self, sample):
+        """Return the ``time.perf_counter()`` at which ``sample`` was
+        written, or nan if it was not yet.
+        """
+        written = self._times[sample // self.slice_size]
+        return written if written else float("nan")
+
+    def position(self, at):
+        """Return the number of samples written by ``time.perf_counter()``
+        ``at``, when the stream does not loop.
+        """
+        times = np.frombuffer(self._times, dtype=np.float64)
+        written = np.searchsorted(times[times > 0], at, side="right")
+        return int(written) * self.slice_size
+
+
+def measure(samples, events, sample_freq=SERIAL_FREQ, rate=1.0,
+            factory=Session, params=DEFAULT_PARAMS, tolerance=LAP_TOLERANCE,
+            overload=DROP_OLDEST):
+    """Stream ``samples`` through the serial path and match the actions to
+    the injected ``events``.
+
+    Every movement is mapped to an action named after it, recorded when
+    the dispatcher runs it. An event is detected by the first action
+    within ``tolerance`` seconds of signal after its start, and its
+    latency is the wall time from the write of its last sample to the
+    action. The double blink does not toggle the actions here.
+    """
+    keymap = {movement.value: movement.value for movement in EyeMovement}
+    actions = []
+
+    def record(key):
+        actions.append((time.perf_counter(), key))
+
+    registry = Registry()
+    dispatcher = ActionDispatcher(
+        {key: partial(record, key) for key in keymap}, verbose=False,
+        registry=registry)
+    simulator = Simulator(samples, sample_freq, rate)
+    session = factory(simulator.port, keymap,
+                      on_movement=lambda _, movement: dispatcher.submit(
+                          keymap[movement.value]),
+                      overload=overload, registry=registry, params=params)
+    simulator.start()
+    dispatcher.start()
+    started = time.perf_counter()
+    session.start()
+    simulator.join()
+    elapsed = time.perf_counter() - started
+    time.sleep(DRAIN_SECONDS / (rate or 1.0) + DRAIN_SECONDS)
+    stats = session.stats()
+    session.stop(timeout=1.0)
+    dispatcher.stop(timeout=1.0)
+    simulator.stop(timeout=1.0)
+
+    matched = set()
+    detected, correct, latency = 0, 0, []
+    for event in events:
+        for i, (at, key) in enumerate(actions):
+            position = simulator.position(at)
+            if (i in matched or position < event.start
+                    or position > event.end + tolerance * sample_freq):
+                continue
+            matched.add(i)
+            detected += 1
+            if key == event.movement.value:
+                correct += 1
+                latency.append(at - simulator.written_at(event.end - 1))
+            break
+    return {
+        "rate": len(samples) / sample_freq / elapsed,
+        "events": len(events),
+        "detected": detected,
+        "correct": correct,
+        "spurious": len(actions) - len(matched),
+        "latency": summary(latency),
+        "lost": simulator.lost / len(simulator.data),
+        "dropped_bytes": stats["dropped_bytes"],
+        "dropped_chunks": stats["dropped_chunks"],
+    }
+
+
+def clean(results):
+    """Return whether nothing was dropped on the way to the classifier."""
+    return not (results["lost"] or results["dropped_bytes"]
+                or results["dropped_chunks"])
+
+
+def find_max_rate(samples, events, rates=RATES, **kwargs):
+    """Run :func:`measure` at every rate in ``rates``, in order, until
+    frames are dropped, and return the results by rate.
+    """
+    results = {}
+    for rate in rates:
+        results[rate] = measure(samples, events, rate=rate, **kwargs)
+        if not clean(results[rate]):
+            break
+    return results
+
+
+def serve(samples, sample_freq=SERIAL_FREQ, rate=1.0):
+    simulator = Simulator(samples, sample_freq, rate, loop=True)
+    print(f"streaming to {simulator.port}, press Ctrl-C to stop",
+          file=sys.stderr)
+    simulator.start()
+    try:
+        simulator.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop(timeout=1.0)
+
+
+def parse_injection(text):
+    movement, _, seconds = text.partition("@")
+    return Injection(float(seconds), EyeMovement(movement))
+
+
+def print_results(results):
+    latency = results["latency"]
+    print(f"{results['rate']:>6.1f}x "
+          f"{results['correct']:>3}/{results['events']:<3} correct "
+          f"{results['detected'] - results['correct']:>2} wrong "
+          f"{results['spurious']:>2} spurious "
+          f"{results['lost']:>6.1%} lost "
+          f"{results['dropped_bytes']:>5} bad bytes "
+          f"{results['dropped_chunks']:>3} dropped chunks "
+          + ("" if latency is None else
+             f"latency mean {latency['mean'] * 1000:.0f} ms, "
+             f"p95 {latency['p95'] * 1000:.0f} ms"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m eyeplay.simulator",
+        description="Stream a recording to a pseudo-terminal like a "
+                    "SpikerBox and measure the serial path.")
+    parser.add_argument("recording", nargs="?",
+                        help="recording to stream, a quiet synthetic signal "
+                             "by default")
+    parser.add_argument("--seconds", type=float, default=SECONDS,
+                        help="of the signal to stream")
+    parser.add_argument("--rate", default="1",
+                        help="speed relative to the device, or max to write "
+                             "as fast as the reader takes it")
+    parser.add_argument("--inject", action="append", default=[],
+                        type=parse_injection, metavar="MOVEMENT@SECONDS",
+                        help="inject a movement, may be repeated, e.g. "
+                             "double_left@12.5")
+    parser.add_argument("--every", type=float, default=EVENT_EVERY,
+                        metavar="SECONDS",
+                        help="without --inject, inject every movement in "
+                             "turn this often, 0 for none")
+    parser.add_argument("--find-max-rate", action="store_true",
+                        help="double the rate until frames are dropped")
+    parser.add_argument("--serve", action="store_true",
+                        help="only stream, in a loop, for another program")
+    parser.add_argument("--reader-process", action="store_true",
+                        help="read the port in a child process, see "
+                             "ProcessSession; needs fork, so not on Windows")
+    parser.add_argument("--detector", default=DETECTOR_PATH,
+                        help="detector parameters exported by eyeplay.sweep")
+    parser.add_argument("--tolerance", type=float, default=LAP_TOLERANCE,
+                        help="seconds of signal from a movement to its "
+                             "detection")
+    parser.add_argument("--output", help="save the results as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        rate = None if args.rate == "max" else float(args.rate)
+    except ValueError:
+        parser.error(f"invalid rate: {args.rate}")
+    if args.recording:
+        recording = datasets.load(args.recording)
+        sample_freq = recording.sample_freq
+        samples = device_samples(
+            recording.samples[:int(args.seconds * sample_freq)])
+    else:
+        sample_freq = SERIAL_FREQ
+        samples = quiet_samples(args.seconds, sample_freq)
+    injections = args.inject
+    if not injections and args.every:
+        injections = every(len(samples) / sample_freq, args.every)
+    try:
+        samples, events = inject(samples, injections, sample_freq)
+    except ValueError as error:
+        parser.error(str(error))
+
+    if args.serve:
+        serve(samples, sample_freq, rate or 1.0)
+        return
+    kwargs = {
+        "sample_freq": sample_freq,
+        "factory": ProcessSession if args.reader_process else Session,
+        "params": read_detector(args.detector),
+        "tolerance": args.tolerance,
+    }
+    if args.find_max_rate:
+        results = find_max_rate(samples, events, **kwargs)
+        for result in results.values():
+            print_results(result)
+        rates = [result["rate"] for result in results.values()
+                 if clean(result)]
+        print(f"sustained {max(rates):.0f}x without dropping frames"
+              if rates else "dropped frames at every rate")
+    else:
+        results = measure(samples, events, rate=rate, **kwargs)
+        print_results(results)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Connection to the Spotify Web API, shared by the scripts.
+
+The client authenticates on a background thread the first time it is
+needed, so a slow or unreachable token endpoint never holds up the caller,
+and device playback keeps working in the meantime. The token is cached in
+``.config/spiker_playback`` and refreshed by spotipy when it expires. All
+requests go through one pooled HTTP session, so commands reuse a kept-alive
+connection instead of opening a new one.
+
+spotipy is imported on first use, so the application starts without it
+when no Spotify action is mapped.
+"""
+import threading
+import time
+from pathlib import Path
+
+# Spotify API configuration
+USERNAME = 'Nhat Huy Le'
+CLIENT_ID = '2b0cdf67c2da453fa658c15c7947ba42'
+CLIENT_SECRET = '********************************'
+REDIRECT_URI = 'http://localhost:3000'
+SCOPE = 'user-read-playback-state,user-modify-playback-state'
+
+TOKEN_PATH = ".config/spiker_playback/spotify_token"
+POOL_SIZE = 4  # connections kept alive
+TIMEOUT = 5.0  # seconds per request
+RETRY_SECONDS = 30.0  # wait after a failed authentication
+
+
+class SpotifyUnavailable(Exception):
+    pass
+
+
+def http_session(pool_size=POOL_SIZE):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def create_client(session=None):
+    """Authenticate and return a ``spotipy.Spotify`` client.
+
+    Blocks, and prompts for the redirect URL on the first run, until a
+    token is cached.
+    """
+    import spotipy
+    from spotipy.cache_handler import CacheFileHandler
+    from spotipy.oauth2 import SpotifyOAuth
+
+    if session is None:
+        session = http_session()
+    Path(TOKEN_PATH).parent.mkdir(parents=True, exist_ok=True)
+    auth_manager = SpotifyOAuth(
+        client_id=CLIENT_ID,
+        client_secret=CLIENT_SECRET,
+        redirect_uri=REDIRECT_URI,
+        scope=SCOPE,
+        cache_handler=CacheFileHandler(cache_path=TOKEN_PATH,
+                                       username=USERNAME),
+        requests_session=session,
+        requests_timeout=TIMEOUT,
+    )
+    # fetch, or refresh, the token now rather than on the first command
+    auth_manager.get_access_token(as_dict=False)
+    return spotipy.Spotify(auth_manager=auth_manager,
+                           requests_session=session,
+                           requests_timeout=TIMEOUT)
+
+
+class SpotifyConnection:
+    """A client created by ``create`` on a background thread.
+
+    :meth:`client` raises :class:`SpotifyUnavailable` until the client is
+    ready. After a failure, authentication is tried again on the next call
+    once ``retry`` seconds have passed.
+    """
+
+    def __init__(self, create=create_client, retry=RETRY_SECONDS):
+        self.create = create
+        self.retry = retry
+        self.error = None
+        self._client = None
+        self._thread = None
+        self._failed = float("-inf")
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return self._client is not None
+
+    def start(self):
+        """Start authenticating, unless done, running or failed recently."""
+        with self._lock:
+            if (self._client is None
+                    and (self._thread is None or not self._thread.is_alive())
+                    and time.monotonic() - self._failed >= self.retry):
+                self._thread = threading.Thread(target=self._authenticate,
+                                                daemon=True,
+                                                name="spotify auth")
+                self._thread.start()
+        return self
+
+    def _authenticate(self):
+        try:
+            client = self.create()
+        except Exception as error:
+            print(f"{time.time()}: Spotify authentication failed: {error!r}")
+            with self._lock:
+                self.error = error
+                self._failed = time.monotonic()
+            return
+        with self._lock:
+            self._client = client
+            self.error = None
+        print(f"{time.time()}: Spotify connected")
+
+    def client(self, timeout=0):
+        """Return the client, waiting up to ``timeout`` seconds for it, or
+        for good when ``timeout`` is None.
+        """
+        self.start()
+        thread = self._thread
+        if timeout != 0 and thread is not None:
+            thread.join(timeout)
+        if self._client is None:
+            raise SpotifyUnavailable(
+                "Spotify is not connected"
+                + (f": {self.error!r}" if self.error is not None else ""))
+        return self._client
+
+
+connection = SpotifyConnection()
+
+
+def authenticate():
+    """Start authenticating the shared client in the background."""
+    return connection.start()
+
+
+def connect(timeout=0):
+    """Return the shared client, see :meth:`SpotifyConnection.client`."""
+    return connection.client(timeout)
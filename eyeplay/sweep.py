@@ -0,0 +1,277 @@
+"""Search the detector parameters over the labelled recordings.
+
+Each trial replays every recording under ``paths`` with one set of
+:class:`eyeplay.pipeline.DetectorParams`, see :mod:`eyeplay.evaluate`, and
+the trials run on a pool of processes. Filtering depends on nothing but
+``sigma``, so the filtered signals are computed once per sigma and cached
+with the recordings, see :mod:`eyeplay.datasets`. Trials are ranked by
+accuracy, then by mean latency::
+
+    python -m eyeplay.sweep --random 200 --export
+    python -m eyeplay.sweep --grid --set sigma=25 --set prominence=40,50,60
+
+With ``--export``, the best parameters are saved where the application
+and the daemon load them, see :func:`eyeplay.config.read_detector`.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+from eyeplay import datasets
+from eyeplay.config import DETECTOR_PATH, write_detector
+from eyeplay.datasets import CACHE_DIR, DATA_DIR, cache_key
+from eyeplay.evaluate import LAP_TOLERANCE, evaluate, macro
+from eyeplay.pipeline import (
+    DECIMATION,
+    DEFAULT_PARAMS,
+    Classifier,
+    DetectorParams,
+)
+from eyeplay.replay import filter_signal
+
+# the values tried by --grid, and the ranges drawn from by --random
+GRID = {
+    "sigma": (15, 20, 25, 30, 40),
+    "variance_threshold": (150, 200, 250, 300, 400),
+    "offset_threshold": (100, 150, 200),
+    "prominence": (30, 40, 50, 60, 80),
+    "blink_peak_gap_seconds": (0.15, 0.18, 0.2065, 0.24, 0.28),
+    "min_event_seconds": (0.2, 0.3, 0.4, 0.6),
+    "smooth_window_seconds": (0.02, 0.05, 0.1),
+}
+RANDOM_TRIALS = 100
+TOP = 10
+
+
+def filtered(recording, sigma, cache_dir=CACHE_DIR):
+    """Return the samples of ``recording`` filtered with ``sigma`` and
+    decimated, as :func:`eyeplay.replay.replay` would, memory-mapped from
+    the cache.
+    """
+    cache_dir = Path(cache_dir) / "filtered"
+    key = f"{cache_key(recording.path)}-sigma{sigma:g}-x{DECIMATION}"
+    path = cache_dir / f"{key}.npy"
+    try:
+        return np.load(path, mmap_mode="r")
+    except (FileNotFoundError, ValueError):
+        pass
+    signal = filter_signal(recording.samples, recording.sample_freq, sigma)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # workers may fill the same entry, each under its own temporary name
+    partial_path = cache_dir / f"{key}.{os.getpid()}.partial.npy"
+    np.save(partial_path, signal)
+    os.replace(partial_path, path)
+    return np.load(path, mmap_mode="r")
+
+
+def grid_params(grid):
+    names = list(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        yield DEFAULT_PARAMS._replace(**dict(zip(names, values)))
+
+
+def random_params(grid, n, seed=None):
+    """Draw ``n`` parameter sets uniformly between the smallest and the
+    largest value of each parameter in ``grid``.
+
+    Sigma is drawn from its values only, since every sigma needs its own
+    filtered signals.
+    """
+    rng = np.random.default_rng(seed)
+    for _ in range(n):
+        params = {}
+        for name, values in grid.items():
+            if name == "sigma" or len(values) == 1:
+                params[name] = values[rng.integers(len(values))]
+                continue
+            value = rng.uniform(min(values), max(values))
+            if all(isinstance(v, int) for v in values):
+                value = int(round(value))
+            params[name] = value
+        yield DEFAULT_PARAMS._replace(**params)
+
+
+def accuracy(results):
+    """Return the share of events and detections classified correctly.
+
+    Missed events and detections without an event count as errors.
+    """
+    confusion = np.asarray(results["confusion"]["matrix"])
+    total = confusion.sum()
+    return float(np.trace(confusion) / total) if total else None
+
+
+def score(results):
+    latency = results["latency"]["signal_seconds"]
+    return {
+        "accuracy": accuracy(results),
+        "precision": macro(results, "precision"),
+        "recall": macro(results, "recall"),
+        "latency": None if latency is None else latency["mean"],
+    }
+
+
+def rank(trial):
+    scores = trial["scores"]
+    latency = scores["latency"]
+    return (-(scores["accuracy"] or 0.0),
+            float("inf") if latency is None else latency)
+
+
+def _filter_one(args):
+    path, sigma, cache_dir = args
+    filtered(datasets.load(path), sigma, cache_dir)
+
+
+def _trial(args):
+    paths, params, tolerance, cache_dir = args
+    results = evaluate(paths, partial(Classifier, params=params), tolerance,
+                       signals=partial(filtered, sigma=params.sigma,
+                                       cache_dir=cache_dir))
+    return {"params": params._asdict(), "scores": score(results)}
+
+
+def sweep(paths, trials, tolerance=LAP_TOLERANCE, processes=None,
+          cache_dir=CACHE_DIR, verbose=True):
+    """Evaluate every parameter set in ``trials`` and return the results
+    from best to worst, in the order of ``trials`` among equals.
+
+    The trials are spread over ``processes`` worker processes, all the CPUs
+    by default, or run in this process when ``processes`` is 1.
+    """
+    paths = [str(path) for path in paths]
+    trials = list(trials)
+    recordings = [recording.path for recording in datasets.load_all(paths)]
+    sigmas = sorted({params.sigma for params in trials})
+    jobs = [(path, sigma, cache_dir)
+            for path in recordings for sigma in sigmas]
+    trial_jobs = [(paths, params, tolerance, cache_dir) for params in trials]
+
+    results = []
+    pool = _Serial() if processes == 1 else multiprocessing.Pool(processes)
+    with pool:
+        start = time.perf_counter()
+        for _ in pool.imap(_filter_one, jobs):
+            pass
+        if verbose:
+            print(f"filtered {len(recordings)} recordings for "
+                  f"{len(sigmas)} sigmas in "
+                  f"{time.perf_counter() - start:.1f} s", file=sys.stderr)
+        start = time.perf_counter()
+        for i, trial in enumerate(pool.imap(_trial, trial_jobs)):
+            results.append(trial)
+            if verbose:
+                print(f"\rtrial {i + 1}/{len(trial_jobs)}, "
+                      f"{time.perf_counter() - start:.0f} s", end="",
+                      file=sys.stderr)
+        if verbose and trial_jobs:
+            print(file=sys.stderr)
+    return sorted(results, key=rank)
+
+
+class _Serial:
+    # the Pool interface used above, in this process
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def imap(self, func, iterable):
+        return map(func, iterable)
+
+
+def parse_values(text):
+    values = []
+    for value in text.split(","):
+        number = float(value)
+        values.append(int(number) if number.is_integer() and "." not in value
+                      else number)
+    return tuple(values)
+
+
+def print_trials(trials, top=TOP):
+    names = DetectorParams._fields
+    print(" ".join(f"{name[:10]:>10}" for name in names)
+          + f" {'accuracy':>8} {'recall':>6} {'latency':>7}")
+    for trial in trials[:top]:
+        params, scores = trial["params"], trial["scores"]
+        latency = scores["latency"]
+        print(" ".join(f"{params[name]:>10.4g}" for name in names)
+              + f" {scores['accuracy'] or 0:>8.3f}"
+              + f" {scores['recall'] or 0:>6.3f}"
+              + f" {'-' if latency is None else f'{latency:.3f}':>7}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", default=[DATA_DIR],
+                        help="recordings or directories of them")
+    search = parser.add_mutually_exclusive_group()
+    search.add_argument("--grid", action="store_true",
+                        help="try every combination of the values")
+    search.add_argument("--random", type=int, metavar="N",
+                        default=RANDOM_TRIALS,
+                        help="try N random combinations (default: "
+                             f"{RANDOM_TRIALS})")
+    parser.add_argument("--set", action="append", default=[],
+                        metavar="NAME=V1,V2",
+                        help="values of a parameter, replacing those of the "
+                             "default grid")
+    parser.add_argument("--seed", type=int, help="of the random search")
+    parser.add_argument("--processes", type=int,
+                        help="worker processes, all the CPUs by default")
+    parser.add_argument("--tolerance", type=float, default=LAP_TOLERANCE,
+                        help="seconds from a lap to its detection")
+    parser.add_argument("--top", type=int, default=TOP,
+                        help="number of trials to print")
+    parser.add_argument("--output", help="save every trial as JSON")
+    parser.add_argument("--export", nargs="?", const=DETECTOR_PATH,
+                        metavar="PATH",
+                        help="save the best parameters for the application "
+                             f"(default: {DETECTOR_PATH})")
+    args = parser.parse_args(argv)
+
+    grid = dict(GRID)
+    for setting in args.set:
+        name, _, values = setting.partition("=")
+        if name not in grid:
+            parser.error(f"unknown parameter: {name}, "
+                         f"expected one of {', '.join(grid)}")
+        try:
+            grid[name] = parse_values(values)
+        except ValueError:
+            parser.error(f"invalid values for {name}: {values}")
+
+    if not datasets.load_all(args.paths):
+        sys.exit("No readable recordings found, "
+                 "have the Git LFS objects been pulled?")
+    if args.grid:
+        trials = list(grid_params(grid))
+    else:
+        trials = list(random_params(grid, args.random, args.seed))
+    # the current parameters, as the baseline to beat
+    trials.insert(0, DEFAULT_PARAMS)
+
+    results = sweep(args.paths, trials, args.tolerance, args.processes)
+    print_trials(results, args.top)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.export:
+        best = DEFAULT_PARAMS._replace(**results[0]["params"])
+        write_detector(best, args.export)
+        print(f"saved the best parameters to {args.export}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Event detection by counting zero crossings.
+
+Eye movements are slow, large swings, so a window containing one crosses
+the mean of the signal less often than a window of noise. The batch
+functions replace ``eye_movement_ZC`` and ``get_index`` from
+``analysis/zc_event_classifier1.ipynb`` and run in O(N);
+:class:`ZeroCrossingTrigger` is the streaming equivalent for the
+:class:`~eyeplay.pipeline.Classifier`.
+"""
+import numpy as np
+
+from eyeplay.pipeline import size
+from eyeplay.ringbuffer import RingBuffer
+
+# the filtered noise crosses its mean about 13 times per window, a window
+# with a movement in it fewer than 8 times; replayed over synthetic
+# sessions, this threshold finds as many events as the variance trigger
+WINDOW_SECONDS = 0.5
+WINDOW_SIZE = size(WINDOW_SECONDS)
+THRESHOLD = 8
+
+
+def crossing_flags(y):
+    """Return whether the sign changes between each pair of samples."""
+    sign = np.sign(y)
+    return sign[1:] != sign[:-1]
+
+
+def index_of(time, time_point):
+    """Return the index of the first sample at or after ``time_point``."""
+    return np.minimum(np.searchsorted(time, time_point), len(time) - 1)
+
+
+def windowed_crossings(y, time, window_seconds=0.5, step=50):
+    """Count the zero crossings of ``y`` about its mean in sliding windows.
+
+    Windows start every ``step`` samples and span ``window_seconds``.
+    Returns the time at the middle of each window and its count.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    time = np.asarray(time)
+    if len(time) == 0 or time[-1] - time[0] < window_seconds:
+        return np.empty(0, dtype=time.dtype), np.empty(0, dtype=int)
+    cumulative = np.concatenate(
+        ([0], np.cumsum(crossing_flags(y - np.mean(y)))))
+    last = np.flatnonzero(time <= time[-1] - window_seconds)[-1]
+    starts = np.arange(0, last + 1, step)
+    ends = np.searchsorted(time, time[starts] + window_seconds)
+    # the crossings between samples start .. end - 1
+    counts = cumulative[ends - 1] - cumulative[starts]
+    return time[starts] + window_seconds / 2, counts
+
+
+def detect_events(y, time, window_seconds=0.5, percentile=45, step=50):
+    """Return the start and end times of the events in a recording.
+
+    Windows with fewer crossings than the given percentile of all windows
+    are events, and events closer than a window apart are merged.
+    """
+    middles, counts = windowed_crossings(y, time, window_seconds, step)
+    event_times = middles[counts < np.percentile(counts, percentile)]
+    if len(event_times) == 0:
+        return np.empty((0, 2))
+    gaps = np.flatnonzero(np.diff(event_times) > window_seconds)
+    starts = event_times[np.concatenate(([0], gaps + 1))]
+    ends = event_times[np.concatenate((gaps, [len(event_times) - 1]))]
+    return np.column_stack((starts, ends))
+
+
+class ZeroCrossingTrigger:
+    """Event trigger for the classifier, active while the window crosses
+    its mean fewer than ``threshold`` times.
+
+    Each chunk is compared against the mean of the window when it arrives
+    and the count is kept over a ring of crossing flags, so an update costs
+    O(chunk). The trigger stays inactive until a whole window of the signal
+    has been seen. The crossings depend on the filter, so ``threshold``
+    holds for the default sigma of the pipeline.
+    """
+
+    def __init__(self, threshold=THRESHOLD, window_size=WINDOW_SIZE):
+        self.threshold = threshold
+        self.lead = window_size - window_size // 2
+        self.lag = window_size // 2
+        self.samples = RingBuffer(window_size)
+        self.flags = RingBuffer(window_size, dtype=bool)
+        self.count = 0
+        self._last_sign = None
+
+    def update(self, chunk):
+        if len(chunk) == 0:
+            return self._active()
+        self.samples.write(chunk)
+        sign = np.sign(chunk - np.mean(self.samples.latest()))
+        if self._last_sign is None:
+            self._last_sign = sign[0]
+        flags = sign != np.concatenate(([self._last_sign], sign[:-1]))
+        self._last_sign = sign[-1]
+        flags = flags[-self.flags.capacity:]
+        evicted = self.flags.latest()[:max(
+            0, len(self.flags) + len(flags) - self.flags.capacity)]
+        self.count += int(np.count_nonzero(flags)) \
+            - int(np.count_nonzero(evicted))
+        self.flags.write(flags)
+        return self._active()
+
+    def _active(self):
+        return (len(self.flags) == self.flags.capacity
+                and self.count < self.threshold)
@@ -1,26 +1,6 @@
-
-import spotipy
-import spotipy.util as util
-from spotipy.oauth2 import SpotifyOAuth
 from pynput.keyboard import Controller, Key
 
-# Set your Spotify username
-USERNAME = 'Nhat Huy Le'
-
-# Set your Spotify client ID and client secret
-CLIENT_ID = '2b0cdf67c2da453fa658c15c7947ba42'
-CLIENT_SECRET = '********************************'
-REDIRECT_URI = 'http://localhost:3000'
-
-# Scope for controlling playback
-SCOPE = 'user-read-playback-state,user-modify-playback-state'
-
-# Get OAuth token
-token = util.prompt_for_user_token(USERNAME,
-                                   scope=SCOPE,
-                                   client_id=CLIENT_ID,
-                                   client_secret=CLIENT_SECRET,
-                                   redirect_uri=REDIRECT_URI)
+from eyeplay import spotify
 
 def pause_playback(sp):
     sp.pause_playback()
@@ -80,8 +60,11 @@ if input_mode == 'local':
             print("Invalid command")
 elif input_mode == 'server':
     # Example usage
-    if token:
-        sp = spotipy.Spotify(auth=token)
+    try:
+        sp = spotify.connect(timeout=None)
+    except spotify.SpotifyUnavailable:
+        sp = None
+    if sp:
         # Wait for user input
         while True:
             # clear the terminal
@@ -114,4 +97,4 @@ elif input_mode == 'server':
             else:
                 print("Invalid command")
     else:
-        print("Can't get token for", USERNAME)
\ No newline at end of file
+        print("Can't get token for", spotify.USERNAME)
\ No newline at end of file
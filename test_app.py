@@ -1,11 +1,21 @@
+"""Random Spotify commands run through the action dispatcher.
+
+A new random command is queued every 5 seconds and a worker wakes up to
+run it straight away. Nothing is locked while a command waits on Spotify,
+and commands are gone from the queue once taken. Run it with
+``python test_app.py``.
+"""
+import random
 import threading
-import spotipy
-import spotipy.util as util
-from spotipy.oauth2 import SpotifyOAuth
-from pynput.keyboard import Controller, Key
-from enum import Enum
 import time
-import random
+from enum import Enum
+
+from eyeplay import spotify
+from eyeplay.dispatcher import ActionDispatcher
+from eyeplay.playback import SpotifyPlayback
+
+INTERVAL = 5.0  # seconds between commands
+
 
 #create a new enum class
 class Command(Enum):
@@ -17,153 +27,45 @@ class Command(Enum):
     VOLUME_DOWN = 6
     QUIT = 7
 
-# Set your Spotify username
-USERNAME = 'Nhat Huy Le'
-
-# Set your Spotify client ID and client secret
-CLIENT_ID = '2b0cdf67c2da453fa658c15c7947ba42'
-CLIENT_SECRET = '********************************'
-REDIRECT_URI = 'http://localhost:3000'
-
-# Scope for controlling playback
-SCOPE = 'user-read-playback-state,user-modify-playback-state'
-
-# Get OAuth token
-token = util.prompt_for_user_token(USERNAME,
-                                   scope=SCOPE,
-                                   client_id=CLIENT_ID,
-                                   client_secret=CLIENT_SECRET,
-                                   redirect_uri=REDIRECT_URI)
-
-# Create Spotify object
-sp = spotipy.Spotify(auth=token)
-
-def pause_playback():
-    sp.pause_playback()
-
-def resume_playback():
-    sp.start_playback()
-
-def next_track():
-    sp.next_track()
-
-def previous_track():
-    sp.previous_track()
-
-#volume up
-def volume_up():
-    current_volume = sp.current_playback()['device']['volume_percent']
-    sp.volume(current_volume + 10)
-
-#volume down
-def volume_down():
-    current_volume = sp.current_playback()['device']['volume_percent']
-    sp.volume(current_volume - 10)
-
-#a node class
-class Node:
-    def __init__(self, data, global_id):
-        self.data = data
-        self.next = None
-        self.processed = False
-        self.id = global_id
-
-#common data
-head = None
-curr = None
-tail = None
-current_state = Command.PAUSE
-current_playback = sp.current_playback()
-if current_playback:
-    current_state = current_playback['is_playing']
-    if current_state:
-        current_state = Command.RESUME
-    else:
-        current_state = Command.PAUSE
-global_id = 0
-
-# Lock for synchronizing access to head pointer
-lock = threading.Lock()
-
-def process_data():
-    global head, curr, tail, global_id
-    while True:
-        # every 5 seconds, create a new node with a random command
-        new_command = random.choice(list(Command))
-        new_node = Node(new_command, global_id)
-        with lock:
-            if head is None:
-                head = new_node
-                curr = new_node
-                tail = new_node
-            else:
-                tail.next = new_node
-                tail = tail.next
-                if curr.processed:
-                    curr = curr.next
-            global_id += 1
-            print("New command added: ", new_command)
-        time.sleep(5)
-
-def process_command():
-    global curr, current_state
-    while True:
-        time.sleep(1)
-        with lock:
-            if curr and not curr.processed:
-                command = curr.data
-                if command == Command.PAUSE and current_state != Command.PAUSE:
-                    pause_playback()
-                    current_state = Command.PAUSE
-                elif command == Command.RESUME and current_state != Command.RESUME:
-                    resume_playback()
-                    current_state = Command.RESUME
-                elif command == Command.NEXT:
-                    next_track()
-                elif command == Command.PREVIOUS:
-                    previous_track()
-                elif command == Command.VOLUME_UP:
-                    volume_up()
-                elif command == Command.VOLUME_DOWN:
-                    volume_down()
-                elif command == Command.QUIT:
-                    break
-                else:
-                    print("Invalid command: ", command)
-                curr.processed = True
-                print("Processed command: ", command)
-                if curr.next:
-                    curr = curr.next
-
-#a function to clean the linked list after every 10 seconds
-def clean_linked_list():
-    global head, curr, tail
-    while True:
-        time.sleep(10)
-        with lock:
-            #delete all processed nodes
-            while head and head.processed:
-                print("Deleted command: ", head.data, " with id: ", head.id)
-                if head.next:
-                    head = head.next
-                else:
-                    head = None
-                    curr = None
-                    tail = None
-
-# Create threads
-t1 = threading.Thread(target=process_data)
-t2 = threading.Thread(target=process_command)
-t3 = threading.Thread(target=clean_linked_list)
-
-# Start threads
-t1.start()
-t2.start()
-t3.start()
-
-# Wait for threads to finish
-t1.join()
-t2.join()
-t3.join()
 
-print("Multithreading example is complete!")
+def command_handlers(playback, quit):
+    # the cached playback state saves reading it before every command
+    return {
+        Command.PAUSE: playback.pause,
+        Command.RESUME: playback.resume,
+        Command.NEXT: playback.next_track,
+        Command.PREVIOUS: playback.previous_track,
+        Command.VOLUME_UP: playback.volume_up,
+        Command.VOLUME_DOWN: playback.volume_down,
+        Command.QUIT: quit.set,
+    }
+
+
+def produce(dispatcher, stopped, interval=INTERVAL):
+    # every few seconds, queue a new random command
+    while not stopped.is_set():
+        command = random.choice(list(Command))
+        dispatcher.submit(command)
+        print(f"{time.time()}: new command {command.name}")
+        stopped.wait(interval)
+
+
+def main():
+    sp = spotify.connect(timeout=None)
+    playback = SpotifyPlayback(sp).start_polling()
+    stopped = threading.Event()
+    dispatcher = ActionDispatcher(command_handlers(playback, stopped)).start()
+    producer = threading.Thread(target=produce, args=(dispatcher, stopped))
+    producer.start()
+    try:
+        stopped.wait()
+    except KeyboardInterrupt:
+        stopped.set()
+    producer.join()
+    dispatcher.stop()
+    playback.stop_polling()
+    print(dispatcher.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""The overload policies of the reader to classifier channel."""
+import threading
+
+import pytest
+
+from eyeplay.channel import DROP_OLDEST, LATEST, Channel
+
+
+def drain(channel):
+    channel.close()
+    return list(iter(channel.get, None))
+
+
+def test_drop_oldest():
+    channel = Channel(3, DROP_OLDEST)
+    for i in range(10):
+        channel.put(i)
+    assert len(channel) == 3
+    assert drain(channel) == [7, 8, 9]
+    assert channel.dropped == 7 and channel.put_count == 10
+
+
+def test_latest():
+    channel = Channel(3, LATEST)
+    for i in range(10):
+        channel.put(i)
+    assert channel.get() == 9
+    # 7 pushed out of the full channel, and 2 skipped by get
+    assert channel.dropped == 9
+    channel.put(10)
+    assert drain(channel) == [10]
+    assert channel.dropped == 9
+
+
+def test_nothing_dropped_within_maxsize():
+    channel = Channel(3)
+    for i in range(3):
+        channel.put(i)
+    assert drain(channel) == [0, 1, 2]
+    assert channel.dropped == 0
+
+
+def test_get_wakes_on_put_and_close():
+    channel = Channel(3)
+    got = []
+    thread = threading.Thread(
+        target=lambda: got.extend(iter(channel.get, None)))
+    thread.start()
+    channel.put(1)
+    channel.close()
+    thread.join(5)
+    assert not thread.is_alive() and got == [1]
+
+
+def test_get_times_out():
+    assert Channel(3).get(timeout=0.01) is None
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        Channel(3, "newest")
@@ -0,0 +1,41 @@
+"""The frame decoder on reads split anywhere in the stream."""
+import numpy as np
+import pytest
+
+from eyeplay.decoder import FrameDecoder, encode_frames
+
+
+@pytest.fixture
+def samples():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 1 << 14, 1000).astype(np.int16)
+
+
+def decode(stream, size):
+    decoder = FrameDecoder()
+    chunks = [decoder.decode(stream[i:i + size])
+              for i in range(0, len(stream), size)]
+    return np.concatenate(chunks), decoder
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 2001])
+def test_frames_split_across_reads(samples, size):
+    decoded, decoder = decode(encode_frames(samples), size)
+    assert np.array_equal(decoded, samples)
+    assert decoder.dropped == 0
+
+
+@pytest.mark.parametrize("size", [1, 3, 64])
+def test_stream_starting_mid_frame(samples, size):
+    decoded, decoder = decode(encode_frames(samples)[1:], size)
+    assert np.array_equal(decoded, samples[1:])
+    assert decoder.dropped == 1
+
+
+def test_bytes_outside_frames_are_dropped(samples):
+    frames = encode_frames(samples[:2])
+    # a lone data byte, and a sync byte followed by another sync byte
+    stream = b"\x05" + frames[:2] + b"\x81" + frames[2:]
+    decoded, decoder = decode(stream, 3)
+    assert np.array_equal(decoded, samples[:2])
+    assert decoder.dropped == 2
@@ -0,0 +1,39 @@
+"""The action dispatcher, with plain callables for handlers."""
+import time
+
+from eyeplay.dispatcher import ActionDispatcher
+from eyeplay.metrics import Registry
+
+
+def dispatcher(calls, **kwargs):
+    handlers = {
+        "next": lambda: calls.append(("next", 1)),
+        "up": lambda steps: calls.append(("up", steps)),
+    }
+    return ActionDispatcher(handlers, coalesce=("up",), verbose=False,
+                            registry=Registry(), **kwargs)
+
+
+def test_coalesced_repeats_after_a_stale_head_run():
+    calls = []
+    d = dispatcher(calls, deadline=1.0)
+    old = time.perf_counter() - 5.0
+    for created in (old, old, None, None, None):
+        d.submit("up", created)
+    d.start()
+    d.stop()
+    assert calls == [("up", 3)]
+    assert d.stale == 2
+
+
+def test_stale_commands_are_discarded():
+    calls = []
+    d = dispatcher(calls, deadline=1.0)
+    old = time.perf_counter() - 5.0
+    for key in ("up", "up", "next"):
+        d.submit(key, old)
+    d.submit("next")
+    d.start()
+    d.stop()
+    assert calls == [("next", 1)]
+    assert d.stale == 3
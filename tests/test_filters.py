@@ -0,0 +1,71 @@
+"""The streaming filters against the same signal filtered in one go."""
+import numpy as np
+import pytest
+
+from eyeplay.filters import ButterworthFilter, GaussianFilter
+
+SIGMA = 25
+SAMPLE_FREQ = 10_000
+
+
+@pytest.fixture
+def signal():
+    rng = np.random.default_rng(0)
+    return 500 + np.cumsum(rng.standard_normal(20_000))
+
+
+def chunked(filter, signal, sizes):
+    chunks, start = [], 0
+    for size in sizes:
+        chunks.append(filter.process(signal[start:start + size]))
+        start += size
+    chunks.append(filter.process(signal[start:]))
+    return np.concatenate(chunks)
+
+
+# chunk sizes that are not multiples of the decimation, so the kept
+# samples fall at a different phase in every chunk
+SIZES = [[1000] * 19, [997, 3, 1, 1499, 2001, 7, 0, 4321], [1] * 500]
+
+
+@pytest.mark.parametrize("sizes", SIZES)
+@pytest.mark.parametrize("decimation", [1, 3, 10])
+def test_gaussian_chunks_match_one_go(signal, sizes, decimation):
+    whole = GaussianFilter(SIGMA, SAMPLE_FREQ, decimation).process(signal)
+    streamed = chunked(GaussianFilter(SIGMA, SAMPLE_FREQ, decimation),
+                       signal, sizes)
+    assert len(streamed) == len(whole)
+    np.testing.assert_allclose(streamed, whole, rtol=0, atol=1e-8)
+
+
+@pytest.mark.parametrize("decimation", [3, 10])
+def test_gaussian_decimation_keeps_every_nth(signal, decimation):
+    full = GaussianFilter(SIGMA, SAMPLE_FREQ).process(signal)
+    decimated = chunked(GaussianFilter(SIGMA, SAMPLE_FREQ, decimation),
+                        signal, SIZES[1])
+    np.testing.assert_allclose(decimated, full[::decimation], rtol=0,
+                               atol=1e-8)
+
+
+def test_gaussian_delay(signal):
+    filter = GaussianFilter(SIGMA, SAMPLE_FREQ)
+    filtered = filter.process(signal)
+    delay = filter.delay
+    # away from the start, output i is the kernel centred on input i - delay
+    expected = np.convolve(signal, filter.kernel, mode="valid")
+    np.testing.assert_allclose(filtered[2 * delay:], expected, rtol=0,
+                               atol=1e-8)
+
+
+def test_gaussian_reset(signal):
+    filter = GaussianFilter(SIGMA, SAMPLE_FREQ, decimation=10)
+    first = filter.process(signal[:1234])
+    filter.reset()
+    assert np.array_equal(filter.process(signal[:1234]), first)
+
+
+@pytest.mark.parametrize("sizes", SIZES)
+def test_butterworth_chunks_match_one_go(signal, sizes):
+    whole = ButterworthFilter(SIGMA, SAMPLE_FREQ).process(signal)
+    streamed = chunked(ButterworthFilter(SIGMA, SAMPLE_FREQ), signal, sizes)
+    np.testing.assert_allclose(streamed, whole, rtol=0, atol=1e-8)
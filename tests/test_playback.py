@@ -0,0 +1,141 @@
+"""The Spotify playback cache against a local fake of the API.
+
+Run from the repository root with ``python -m pytest tests``.
+"""
+import threading
+import time
+
+import pytest
+
+spotipy = pytest.importorskip("spotipy")
+
+from eyeplay.fakespotify import FakeSpotify
+from eyeplay.playback import SpotifyPlayback
+from eyeplay.spotify import http_session
+
+GET = "GET /v1/me/player"
+PLAY = "PUT /v1/me/player/play"
+PAUSE = "PUT /v1/me/player/pause"
+VOLUME = "PUT /v1/me/player/volume"
+NEXT = "POST /v1/me/player/next"
+
+
+@pytest.fixture
+def fake():
+    with FakeSpotify() as fake:
+        yield fake
+
+
+def client(fake):
+    sp = spotipy.Spotify(auth="fake", requests_session=http_session())
+    sp.prefix = fake.url
+    return sp
+
+
+def requests(fake):
+    """Return the requests made so far, and forget them."""
+    counts = dict(fake.requests)
+    fake.requests.clear()
+    return counts
+
+
+def test_first_command_reads_the_state_once(fake):
+    playback = SpotifyPlayback(client(fake))
+    playback.playpause()
+    assert requests(fake) == {GET: 1, PLAY: 1}
+    assert playback.is_playing and fake.is_playing
+    assert playback.volume == 50
+
+
+def test_commands_within_ttl_are_single_requests(fake):
+    playback = SpotifyPlayback(client(fake), ttl=60.0)
+    playback.refresh()
+    requests(fake)
+
+    playback.playpause()
+    playback.playpause()
+    playback.volume_up()
+    playback.volume_up()
+    playback.volume_down()
+    playback.next_track()
+    playback.mute()
+    assert requests(fake) == {PLAY: 1, PAUSE: 1, VOLUME: 4, NEXT: 1}
+    assert playback.is_playing is False and fake.is_playing is False
+    assert playback.volume == 0 and fake.volume == 0
+    assert fake.track == 1
+
+
+def test_volume_is_clamped_to_the_api_range(fake):
+    fake.volume = 95
+    playback = SpotifyPlayback(client(fake), ttl=60.0)
+    playback.volume_up()
+    playback.volume_up()
+    assert requests(fake) == {GET: 1, VOLUME: 2}
+    assert playback.volume == 100 and fake.volume == 100
+
+
+def test_expired_state_is_read_again(fake):
+    playback = SpotifyPlayback(client(fake), ttl=0.05)
+    playback.volume_up()
+    fake.volume = 20  # changed from another device
+    time.sleep(0.1)
+    playback.volume_up()
+    assert requests(fake) == {GET: 2, VOLUME: 2}
+    assert playback.volume == 30 and fake.volume == 30
+
+
+def test_inactive_device_is_not_commanded(fake):
+    fake.active = False
+    playback = SpotifyPlayback(client(fake), ttl=60.0)
+    playback.volume_up()
+    playback.volume_down()
+    assert requests(fake) == {GET: 1}
+    assert playback.is_playing is False and playback.volume is None
+
+
+def test_poller_keeps_the_state_fresh(fake):
+    playback = SpotifyPlayback(client(fake), ttl=60.0)
+    playback.start_polling(interval=0.02)
+    try:
+        fake.is_playing = True
+        fake.volume = 70
+        deadline = time.monotonic() + 2.0
+        while (playback.volume != 70
+               and time.monotonic() < deadline):
+            time.sleep(0.01)
+        assert playback.is_playing and playback.volume == 70
+    finally:
+        playback.stop_polling()
+    time.sleep(0.05)
+    assert requests(fake).keys() == {GET}
+
+    # the polled state is fresh, so commands do not read it again
+    playback.playpause()
+    playback.volume_down()
+    time.sleep(0.05)
+    assert requests(fake) == {PAUSE: 1, VOLUME: 1}
+    assert playback.is_playing is False and playback.volume == 60
+
+
+def test_refresh_during_a_command_keeps_the_update(fake):
+    fake.latency = 0.1
+    playback = SpotifyPlayback(client(fake), ttl=60.0)
+    # the state read by the refresh predates the command sent meanwhile
+    refresh = threading.Thread(target=playback.refresh)
+    refresh.start()
+    time.sleep(0.02)
+    playback.set_volume(80)
+    refresh.join()
+    assert requests(fake) == {GET: 1, VOLUME: 1}
+    assert playback.volume == 80 and fake.volume == 80
+
+
+def test_pause_and_resume_skip_a_known_state(fake):
+    playback = SpotifyPlayback(client(fake), ttl=60.0)
+    playback.pause()
+    playback.resume()
+    playback.resume()
+    playback.pause()
+    playback.pause()
+    assert requests(fake) == {GET: 1, PLAY: 1, PAUSE: 1}
+    assert playback.is_playing is False and fake.is_playing is False
@@ -0,0 +1,51 @@
+"""The ring buffer against a plain array of everything written."""
+import numpy as np
+import pytest
+
+from eyeplay.ringbuffer import RingBuffer
+
+CAPACITY = 100
+
+
+@pytest.mark.parametrize("sizes", [[30] * 10, [99, 2, 1, 150, 37, 0, 64],
+                                   [1] * 250])
+def test_latest_after_wrapping(sizes):
+    ring = RingBuffer(CAPACITY)
+    written = np.empty(0)
+    for size in sizes:
+        chunk = np.arange(len(written), len(written) + size, dtype=float)
+        ring.write(chunk)
+        written = np.concatenate((written, chunk))
+        assert len(ring) == min(len(written), CAPACITY)
+        assert np.array_equal(ring.latest(), written[-CAPACITY:])
+        assert np.array_equal(ring.latest(7), written[-CAPACITY:][-7:])
+
+
+def test_fill_and_clear():
+    ring = RingBuffer(CAPACITY, fill=500.0)
+    assert len(ring) == CAPACITY
+    assert np.all(ring.latest() == 500.0)
+    ring.clear()
+    assert len(ring) == 0 and len(ring.latest()) == 0
+    ring.write(np.ones(3))
+    assert np.array_equal(ring.latest(), np.ones(3))
+
+
+def test_views_are_read_only():
+    ring = RingBuffer(CAPACITY)
+    ring.write(np.arange(150.0))
+    view = ring.latest(10)
+    assert not view.flags.writeable
+    with pytest.raises(ValueError):
+        view[0] = -1.0
+    assert np.array_equal(ring.latest(10), np.arange(140.0, 150.0))
+
+
+def test_copies_are_independent():
+    ring = RingBuffer(CAPACITY)
+    ring.write(np.arange(50.0))
+    copy = ring.latest(10, copy=True)
+    assert copy.flags.writeable
+    copy[:] = -1.0
+    ring.write(np.arange(100.0, 200.0))
+    assert np.array_equal(ring.latest(10), np.arange(190.0, 200.0))